@@ -1,37 +1,64 @@
-from microbit import *
-from keyes_Bit_Car_Driver import *
-bitCar = Bit_Car_Driver()
-val_LL = 0
-
-bitCar.headlights(0, 0, 0)
-
-bitCar.motorL(1,70)
-bitCar.motorR(1,70)
-while True:
-    if button_a.is_pressed():
-        break
-    #if pin2.is_touched() and button_b.is_pressed():
-        #print("obstacle forward")
-        #bitCar.motorL(1,70)
-        #bitCar.motorR(0,70)
-        #while pin2.is_touched() or button_b.is_pressed():
-            #sleep(100)
-        #bitCar.motorR(1,70)
-
-    elif pin2.is_touched():
-        print("obstacle left")
-        bitCar.motorR(1,0)
-        while pin2.is_touched():
-            sleep(100)
-        bitCar.motorR(1,70)
-
-    elif button_b.is_pressed():
-        print("obstacle right")
-        bitCar.motorL(1,0)
-        while button_b.is_pressed():
-            sleep(100)
-        bitCar.motorL(1,70)
-
-    sleep(200)
-bitCar.motorL(1,0)
-bitCar.motorR(1,0)
+from microbit import *
+from keyes_Bit_Car_Driver import *
+from scheduler import Scheduler
+
+SPEED = 70
+# Task periods in ms
+SENSE_MS = 10
+DRIVE_MS = 20
+DISPLAY_MS = 100
+
+bitCar = Bit_Car_Driver()
+scheduler = Scheduler()
+# Written by sense, read by drive and show
+obstacle = {'left': False, 'right': False}
+
+bitCar.headlights(0, 0, 0)
+
+def sense():
+    while True:
+        if button_a.is_pressed():
+            scheduler.stop()
+        obstacle['left'] = pin2.is_touched()
+        obstacle['right'] = button_b.is_pressed()
+        yield SENSE_MS
+
+def drive():
+    # Stop the wheel on the far side to turn away, only writing on a change
+    speeds = None
+    while True:
+        if obstacle['left']:
+            new_speeds = (SPEED, 0)
+        elif obstacle['right']:
+            new_speeds = (0, SPEED)
+        else:
+            new_speeds = (SPEED, SPEED)
+        if new_speeds != speeds:
+            speeds = new_speeds
+            bitCar.motors(1, speeds[0], 1, speeds[1])
+        yield DRIVE_MS
+
+def show():
+    # Differs from every state so the first pass draws the arrow
+    shown = ''
+    while True:
+        if obstacle['left']:
+            state = "obstacle left"
+        elif obstacle['right']:
+            state = "obstacle right"
+        else:
+            state = None
+        if state != shown:
+            shown = state
+            if state:
+                print(state)
+            display.show(Image.ARROW_E if obstacle['left'] else
+                         Image.ARROW_W if obstacle['right'] else Image.ARROW_N)
+        yield DISPLAY_MS
+
+scheduler.add(sense(), 'sense')
+scheduler.add(drive(), 'drive')
+scheduler.add(show(), 'display')
+scheduler.run()
+bitCar.motors(1,0, 1,0)
+scheduler.report()
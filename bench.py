@@ -0,0 +1,288 @@
+"""Benchmarks for the flood fill and the solver loop of both MazeGrids.
+
+Runs the simulator's NumPy MazeGrid and main3.py's packed MazeGrid (on
+the fake micro:bit) over fixed seeded maze corpora at several sizes, with
+the mazes scanned to several wall-knowledge densities:
+
+  scan     set_wall for all four sides of each scanned cell, in a seeded
+           random cell order, up to the density
+  repair   update_costs_flood_fill after each of those scans
+  full     update_costs_flood_fill(full=True) at the density
+  solve    the whole exploration step (scan, cost update, move choice,
+           move) of the greedy robot from a blank map to the goal
+
+Each case records the best time per call over the repeats, the most
+memory any one call allocated above what was live before it, and the
+peak memory of the whole case including the grid, from tracemalloc in a
+separate untimed pass. --save stores the results as the baseline and
+--check exits non-zero when a case got slower or hungrier than the
+baseline by more than the tolerances. Times only compare on the machine
+that saved the baseline.
+
+    python bench.py --save
+    python bench.py --check
+    python bench.py --sizes 8 16 --densities 0.5 --json bench.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import fakemicrobit
+from mazegen import maze_corpus
+from replay import load_simulator
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(_HERE, "bench_baseline.json")
+SIZES = (8, 16, 32)
+DENSITIES = (0.25, 0.5, 1.0)
+MAZES = 3
+FULL_CALLS = 10
+# How much worse than the baseline a case may get before --check fails:
+# a fraction of the time, and a fraction plus slack bytes of memory
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+MEMORY_SLACK = 512
+
+
+class Implementation:
+    """One MazeGrid and robot pair seen through the same few calls"""
+    def __init__(self, name, grid_class, robot):
+        self.name = name
+        self.grid_class = grid_class
+        self.robot = robot
+
+    def new_grid(self, size):
+        return self.grid_class(size)
+
+
+def implementations():
+    sim = load_simulator()
+    # main3.py needs the micro:bit modules, its Hardware only talks to the
+    # fake car and isn't driven here
+    if "main3" not in sys.modules:
+        fakemicrobit.install(np.ones((2, 2, 4), dtype=bool))
+    import main3
+    hardware = main3.Hardware()
+    return [Implementation("sim", sim.MazeGrid,
+                           lambda grid: sim.DraftRobot(grid, verbose=False)),
+            Implementation("main3", main3.MazeGrid,
+                           lambda grid: main3.Robot(grid, hardware))]
+
+
+def scan_order(size, seed):
+    """Every cell once, in a seeded random order"""
+    order = np.random.RandomState(seed).permutation(size * size)
+    return [(int(i % size), int(i // size)) for i in order]
+
+
+def scan_calls(walls, cells):
+    """set_wall arguments for scanning the cells, as plain Python values"""
+    return [[(x, y, d, bool(walls[y, x, d])) for d in range(4)] for x, y in cells]
+
+
+class Case:
+    """Totals for one benchmark over the corpus"""
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.alloc = 0
+        self.peak = 0
+
+    def add_time(self, seconds, calls=1):
+        self.seconds += seconds
+        self.calls += calls
+
+    def result(self):
+        return {"us_per_call": self.seconds / self.calls * 1e6 if self.calls else 0.0,
+                "alloc_bytes": self.alloc,
+                "peak_kb": self.peak / 1024}
+
+
+def traced(function, case, start_memory):
+    """Run function, recording in case the most it allocated above the
+    memory live when it started, and the peak above start_memory"""
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    case.alloc = max(case.alloc, peak - before)
+    case.peak = max(case.peak, peak - start_memory)
+    return result
+
+
+def run_density(impl, mazes, density, cases, measure_memory):
+    """The scan, repair and full cases for one density over the corpus"""
+    scan, repair, full = cases
+    perf = time.perf_counter
+    for seed, walls in enumerate(mazes):
+        size = walls.shape[0]
+        start_memory = tracemalloc.get_traced_memory()[0]
+        grid = impl.new_grid(size)
+        set_wall = grid.set_wall
+        update = grid.update_costs_flood_fill
+        cells = scan_order(size, seed)[:max(1, int(round(density * size * size)))]
+        def scan_cell(cell):
+            for call in cell:
+                set_wall(*call)
+
+        for cell in scan_calls(walls, cells):
+            if measure_memory:
+                traced(lambda: scan_cell(cell), scan, start_memory)
+                traced(update, repair, start_memory)
+                continue
+            start = perf()
+            for call in cell:
+                set_wall(*call)
+            middle = perf()
+            update()
+            scan.add_time(middle - start, 4)
+            repair.add_time(perf() - middle)
+        for _ in range(FULL_CALLS):
+            if measure_memory:
+                traced(lambda: update(full=True), full, start_memory)
+                continue
+            start = perf()
+            update(full=True)
+            full.add_time(perf() - start)
+
+
+def run_solve(impl, mazes, case, measure_memory):
+    """Greedy exploration steps from a blank map, per step"""
+    perf = time.perf_counter
+    for walls in mazes:
+        size = walls.shape[0]
+        start_memory = tracemalloc.get_traced_memory()[0]
+        grid = impl.new_grid(size)
+        robot = impl.robot(grid)
+        truth = walls.tolist()
+        goals = set(grid.goal_cells)
+
+        def step():
+            x, y = robot.position
+            robot.update_grid_walls(truth[y][x])
+            moves = robot.get_available_moves()
+            if moves:
+                robot.move_to_cell(*robot.find_lowest_cost_move(moves))
+            return moves
+
+        for _ in range(10 * size * size):
+            if measure_memory:
+                moves = traced(step, case, start_memory)
+            else:
+                start = perf()
+                moves = step()
+                case.add_time(perf() - start)
+            if not moves or tuple(robot.position) in goals:
+                break
+
+
+def run(sizes=SIZES, densities=DENSITIES, mazes=MAZES, repeat=3, cache_dir=None):
+    """All cases as {'impl/bench/size/density': metrics}"""
+    results = {}
+    for impl in implementations():
+        for size in sizes:
+            corpus = maze_corpus(size, mazes, cache_dir=cache_dir)
+            groups = [("solve", "-", lambda cases, memory: run_solve(impl, corpus, cases[0],
+                                                                       memory))]
+            for density in densities:
+                groups.append((("scan", "repair", "full"), density,
+                               lambda cases, memory, density=density: run_density(
+                                   impl, corpus, density, cases, memory)))
+            for names, density, benchmark in groups:
+                names = (names,) if isinstance(names, str) else names
+                best = None
+                for _ in range(repeat):
+                    cases = [Case() for _ in names]
+                    benchmark(cases, False)
+                    seconds = sum(case.seconds for case in cases)
+                    if best is None or seconds < best_seconds:
+                        best, best_seconds = cases, seconds
+                tracemalloc.start()
+                benchmark(best, True)
+                tracemalloc.stop()
+                for name, case in zip(names, best):
+                    results["%s/%s/%d/%s" % (impl.name, name, size, density)] = case.result()
+    return results
+
+
+def case_order(key):
+    """Sort key for case names, sizes in numeric order"""
+    impl, bench, size, density = key.split("/")
+    return impl, bench, int(size), density
+
+
+def regressions(results, baseline):
+    """Lines describing each case worse than the baseline"""
+    problems = []
+    for key in sorted(results, key=case_order):
+        result = results[key]
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result["us_per_call"] > base["us_per_call"] * (1 + TIME_TOLERANCE):
+            problems.append("%s: %.1f us per call, baseline %.1f" % (
+                key, result["us_per_call"], base["us_per_call"]))
+        for metric, slack in (("alloc_bytes", MEMORY_SLACK), ("peak_kb", MEMORY_SLACK / 1024)):
+            if result[metric] > base[metric] * (1 + MEMORY_TOLERANCE) + slack:
+                problems.append("%s: %s %.1f, baseline %.1f" % (key, metric, result[metric],
+                                                                base[metric]))
+    return problems
+
+
+def print_table(results, baseline=None):
+    width = max(len(key) for key in results)
+    print("%-*s %12s %12s %10s %8s" % (width, "case", "us_per_call", "alloc_bytes", "peak_kb",
+                                         "vs_base"))
+    for key in sorted(results, key=case_order):
+        result = results[key]
+        base = (baseline or {}).get(key)
+        change = "%+.0f%%" % (100 * (result["us_per_call"] / base["us_per_call"] - 1)) \
+            if base and base["us_per_call"] else ""
+        print("%-*s %12.1f %12d %10.1f %8s" % (width, key, result["us_per_call"],
+                                                result["alloc_bytes"], result["peak_kb"], change))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flood fill and solver loop benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--densities", type=float, nargs="+", default=list(DENSITIES),
+                        help="fractions of the cells scanned before timing the full fill")
+    parser.add_argument("--mazes", type=int, default=MAZES, help="mazes per size")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs, the best is kept")
+    parser.add_argument("--cache", default=None, metavar="DIR",
+                        help="cache the maze corpora here")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error if a case regressed against the baseline")
+    parser.add_argument("--json", default=None, metavar="FILE", help="also write the results")
+    args = parser.parse_args()
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif args.check:
+        parser.error("no baseline at %s, run with --save first" % args.baseline)
+
+    results = run(args.sizes, args.densities, args.mazes, args.repeat, args.cache)
+    print_table(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print("baseline saved to %s" % args.baseline)
+    if args.check:
+        problems = regressions(results, baseline)
+        for line in problems:
+            print("REGRESSION " + line)
+        if problems:
+            sys.exit(1)
+        print("no regressions against %s" % args.baseline)
@@ -0,0 +1,281 @@
+"""Stand-in micro:bit for running the robot code on a laptop.
+
+install(walls) puts fake microbit, machine and ustruct modules in
+sys.modules and MicroPython's extra time functions (ticks_us, sleep_ms,
+...) on time, all backed by a World: the true maze walls, the car's pose
+and a clock. Install before importing main3.py, hal.py or
+keyes_Bit_Car_Driver.py and they run unchanged.
+
+The clock is elapsed CPU time scaled by cpu_scale, since the micro:bit
+runs Python far slower than a laptop, plus modelled time. Sleeps return
+at once but move the clock on, and every I2C transaction adds its bus
+time at 100 kHz and every serial write its time on the wire. Serial
+output goes to the World's serial file, if it has one. The car moves with the motor PWM the driver writes to
+the PCA9685 and stops short of walls. The ultrasonic echo comes from the
+wall ahead of it.
+
+    python -m fakemicrobit --size 9 --seed 3
+"""
+import math
+import struct
+import sys
+import time
+
+CELL_CM = 18.0
+# Ultrasonic sensor ahead of the car's centre, echo start delay and range
+SENSOR_OFFSET_CM = 4.0
+ECHO_DELAY_US = 300
+MAX_RANGE_CM = 400.0
+CM_PER_ECHO_US = 0.017
+I2C_HZ = 100000
+# Bits on the wire per serial byte, with start and stop bits
+UART_BITS = 10
+PCA9685_ADDRESS = 0x43
+# How close the car's centre gets to a wall ahead, in cells
+ROBOT_HALF = 0.3
+# (dx, dy) for headings N,E,S,W
+HEADINGS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+# The World the fake modules talk to, set by install()
+world = None
+
+
+class World:
+    """The maze, the car in it and the clock.
+
+    walls is indexed [y][x][direction] like the simulator's MazeGrid.walls.
+    cell_ms, turn_ms and drive_speed describe the real car: at drive_speed
+    it covers a cell in cell_ms and turns a quarter in turn_ms, with wheel
+    speed proportional to PWM. The defaults are the same assumed values as
+    motion.CALIBRATION and hal.TURN_MS, not measurements, so a run on the
+    fake car checks the code against the robot's own model, not the real
+    car's timing.
+    """
+    def __init__(self, walls, start=(0, 0), heading=0, cpu_scale=1.0, cell_ms=600,
+                 turn_ms=350, drive_speed=120, serial=None):
+        self.walls = walls
+        self.size = len(walls)
+        self.cpu_scale = cpu_scale
+        # Wheel speed in cells/s at full PWM, and wheel track in cells
+        cells_per_s = 1000 / cell_ms
+        self.full_speed = cells_per_s * 255 / drive_speed
+        self.track = 2 * cells_per_s / (math.pi / 2 / (turn_ms / 1000))
+
+        self.registers = bytearray(256)
+        self.pointer = 0
+        self.i2c_transactions = 0
+        self.i2c_bytes = 0
+        # Binary file for the serial output, and bytes written
+        self.serial = serial
+        self.baudrate = 115200
+        self.serial_bytes = 0
+        self.collisions = 0
+        self.offset_us = 0
+        self.start_ns = time.perf_counter_ns()
+        self.motion_us = 0
+        self.trigger_us = None
+        # (ticks_us, button) presses for was_pressed, and buttons held down
+        self.presses = []
+        self.held = set()
+        self.touched = False
+        self.display_text = ''
+        self.place(start, heading)
+
+    # Clock
+
+    def ticks_us(self):
+        return int(self.offset_us + (time.perf_counter_ns() - self.start_ns) * self.cpu_scale / 1000)
+
+    def sleep_us(self, us):
+        self.update_pose()
+        self.offset_us += us
+
+    # Car
+
+    def place(self, cell, heading=0):
+        """Put the car on a cell centre, as between competition runs"""
+        self.x, self.y = float(cell[0]), float(cell[1])
+        self.angle = heading * math.pi / 2
+        self.motion_us = self.ticks_us()
+
+    def heading(self):
+        return int(round(self.angle / (math.pi / 2))) % 4
+
+    def cell(self):
+        return int(round(self.x)), int(round(self.y))
+
+    def free_cells(self, heading=None):
+        """Cells from the car's centre to the first wall ahead"""
+        heading = self.heading() if heading is None else heading
+        x, y = self.cell()
+        dx, dy = HEADINGS[heading]
+        along = (self.x - x) * dx + (self.y - y) * dy
+        count = 0
+        while not self.walls[y][x][heading]:
+            x += dx
+            y += dy
+            count += 1
+        return count + 0.5 - along
+
+    def wheel_speeds(self):
+        """Left and right wheel speeds in cells/s from the PWM registers"""
+        speeds = []
+        for motor in range(2):
+            direction_on, _ = struct.unpack_from('<HH', self.registers, 6 + 8 * motor)
+            speed_on, speed_off = struct.unpack_from('<HH', self.registers, 10 + 8 * motor)
+            if speed_on & 0x1000:
+                duty = 1.0
+            elif speed_off & 0x1000:
+                duty = 0.0
+            else:
+                duty = ((speed_off - speed_on) % 4096) / 4096
+            # Direction channel fully on runs the motor in reverse
+            speeds.append(duty * self.full_speed * (-1 if direction_on & 0x1000 else 1))
+        return speeds
+
+    def update_pose(self):
+        """Move the car on by the time since the last update"""
+        now = self.ticks_us()
+        dt = (now - self.motion_us) / 1e6
+        self.motion_us = now
+        left, right = self.wheel_speeds()
+        if dt <= 0 or (left == 0 and right == 0):
+            return
+        # Clockwise is positive, left wheel faster turns right
+        self.angle += (left - right) / self.track * dt
+        distance = (left + right) / 2 * dt
+        if distance > 0:
+            room = max(0.0, self.free_cells() - ROBOT_HALF)
+            if distance > room:
+                distance = room
+                self.collisions += 1
+        self.x += distance * math.sin(self.angle)
+        self.y += distance * math.cos(self.angle)
+
+    def settle(self):
+        """Square up on the nearest cell centre and heading once stopped,
+        as the car does against the walls"""
+        self.angle = self.heading() * math.pi / 2
+        x, y = self.cell()
+        self.x, self.y = float(x), float(y)
+
+    # I2C, a PCA9685 with auto-increment
+
+    def i2c_transfer(self, count):
+        self.i2c_transactions += 1
+        self.i2c_bytes += count + 1
+        # 9 clocks per byte including the address, plus start and stop
+        self.sleep_us(((count + 1) * 9 + 2) * 1000000 // I2C_HZ)
+
+    def i2c_write(self, address, buf):
+        if address != PCA9685_ADDRESS:
+            raise OSError(19)
+        self.update_pose()
+        self.i2c_transfer(len(buf))
+        self.pointer = buf[0]
+        for value in buf[1:]:
+            self.registers[self.pointer] = value
+            if self.registers[0] & 0x20:
+                self.pointer = (self.pointer + 1) & 0xFF
+        if len(buf) > 1 and self.wheel_speeds() == [0, 0]:
+            self.settle()
+
+    def i2c_read(self, address, count):
+        if address != PCA9685_ADDRESS:
+            raise OSError(19)
+        self.i2c_transfer(count)
+        data = bytearray(count)
+        for i in range(count):
+            data[i] = self.registers[self.pointer]
+            if self.registers[0] & 0x20:
+                self.pointer = (self.pointer + 1) & 0xFF
+        return bytes(data)
+
+    # Serial
+
+    def serial_write(self, data):
+        self.serial_bytes += len(data)
+        self.sleep_us(len(data) * UART_BITS * 1000000 // self.baudrate)
+        if self.serial is not None:
+            self.serial.write(data)
+            self.serial.flush()
+
+    # Ultrasonic sensor
+
+    def echo_us(self):
+        """Echo pulse width for the wall ahead, None when out of range"""
+        self.update_pose()
+        distance = self.free_cells() * CELL_CM - SENSOR_OFFSET_CM
+        if distance > MAX_RANGE_CM:
+            return None
+        return int(distance / CM_PER_ECHO_US)
+
+    def echo_level(self):
+        if self.trigger_us is None:
+            return 0
+        width = self.echo_us()
+        since = self.ticks_us() - self.trigger_us
+        return int(width is not None and ECHO_DELAY_US <= since < ECHO_DELAY_US + width)
+
+    def time_pulse_us(self, timeout_us):
+        width = self.echo_us() if self.trigger_us is not None else None
+        if width is None or ECHO_DELAY_US > timeout_us:
+            self.sleep_us(timeout_us)
+            return -2
+        if width > timeout_us:
+            self.sleep_us(ECHO_DELAY_US + timeout_us)
+            return -1
+        self.sleep_us(ECHO_DELAY_US + width)
+        return width
+
+    # Buttons and display
+
+    def show(self, text):
+        self.display_text = text
+
+    def was_pressed(self, name):
+        now = self.ticks_us()
+        for i in range(len(self.presses)):
+            when, button = self.presses[i]
+            if button == name and when <= now:
+                del self.presses[i]
+                return True
+        return False
+
+
+def ticks_us():
+    return world.ticks_us()
+
+
+def ticks_ms():
+    return world.ticks_us() // 1000
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def ticks_diff(end, start):
+    return end - start
+
+
+def sleep_us(us):
+    world.sleep_us(us)
+
+
+def sleep_ms(ms):
+    world.sleep_us(ms * 1000)
+
+
+def install(walls, **options):
+    """Create the World for walls and route the micro:bit modules to it.
+    options are passed on to World. Returns the World."""
+    global world
+    world = World(walls, **options)
+    from fakemicrobit import machine, microbit
+    sys.modules['microbit'] = microbit
+    sys.modules['machine'] = machine
+    sys.modules.setdefault('ustruct', struct)
+    for function in (ticks_us, ticks_ms, ticks_add, ticks_diff, sleep_us, sleep_ms):
+        setattr(time, function.__name__, function)
+    return world
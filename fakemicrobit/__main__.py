@@ -0,0 +1,47 @@
+"""Run main3.py's maze solver against a simulated maze on the fake micro:bit"""
+import argparse
+import os
+import sys
+import tempfile
+
+import fakemicrobit
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="main3.py on a fake micro:bit")
+    parser.add_argument("--size", type=int, default=9)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--maze", default=None, metavar="FILE",
+                        help="a .txt, .num or .maz maze file instead of a random maze")
+    parser.add_argument("--speed", action="store_true",
+                        help="follow exploration with a speed run from the saved map")
+    parser.add_argument("--cpu-scale", type=float, default=1.0,
+                        help="how many times slower than this machine the micro:bit runs Python")
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--telemetry", default=None, metavar="FILE",
+                        help="stream telemetry frames to FILE, for watch.py --follow")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from mazegen import generate_maze, load_maze
+    walls = load_maze(args.maze) if args.maze else generate_maze(args.size, args.seed)
+    serial = open(args.telemetry, "wb") if args.telemetry else None
+    world = fakemicrobit.install(walls, cpu_scale=args.cpu_scale, serial=serial)
+    import main3
+
+    size = len(walls)
+    map_path = os.path.join(tempfile.mkdtemp(), main3.MAP_FILE)
+    start = world.ticks_us()
+    print(main3.solve_maze(size, map_path=map_path, profile=args.profile,
+                           telemetry=serial is not None))
+    print("explored in %.1f s robot time, car in cell %s facing %s, %d collisions" % (
+        (world.ticks_us() - start) / 1e6, world.cell(), "NESW"[world.heading()], world.collisions))
+    if args.speed:
+        world.place((0, 0))
+        start = world.ticks_us()
+        print(main3.speed_run(size=size, map_path=map_path))
+        print("speed run in %.1f s robot time, car in cell %s" % (
+            (world.ticks_us() - start) / 1e6, world.cell()))
+    print("%d I2C transactions, %d bytes" % (world.i2c_transactions, world.i2c_bytes))
+    if serial is not None:
+        serial.close()
+        print("%d bytes of telemetry" % world.serial_bytes)
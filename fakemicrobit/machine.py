@@ -0,0 +1,10 @@
+"""Fake machine module, see fakemicrobit"""
+import fakemicrobit as _fake
+
+
+def time_pulse_us(pin, pulse_level, timeout_us=1000000):
+    """Times the ultrasonic echo on pin15, -2 if no pulse starts in time"""
+    if pin.number != 15:
+        _fake.world.sleep_us(timeout_us)
+        return -2
+    return _fake.world.time_pulse_us(timeout_us)
@@ -0,0 +1,110 @@
+"""Fake microbit module, see fakemicrobit"""
+import fakemicrobit as _fake
+
+
+class Image(str):
+    """Images are kept as their names"""
+
+
+for _name in ('HEART', 'HAPPY', 'SAD', 'YES', 'NO', 'ARROW_N', 'ARROW_NE', 'ARROW_E',
+              'ARROW_SE', 'ARROW_S', 'ARROW_SW', 'ARROW_W', 'ARROW_NW'):
+    setattr(Image, _name, Image(_name))
+
+
+class _I2C:
+    def init(self, freq=100000, sda=None, scl=None):
+        pass
+
+    def write(self, addr, buf, repeat=False):
+        _fake.world.i2c_write(addr, bytes(buf))
+
+    def read(self, addr, n, repeat=False):
+        return _fake.world.i2c_read(addr, n)
+
+
+class _UART:
+    def init(self, baudrate=115200, bits=8, parity=None, stop=1, tx=None, rx=None):
+        _fake.world.baudrate = baudrate
+
+    def write(self, buf):
+        _fake.world.serial_write(bytes(buf))
+        return len(buf)
+
+    def any(self):
+        return False
+
+    def read(self, nbytes=None):
+        return None
+
+
+class _Pin:
+    def __init__(self, number):
+        self.number = number
+        self.value = 0
+
+    def write_digital(self, value):
+        # Falling edge on the ultrasonic trigger starts a ping
+        if self.number == 14 and self.value and not value:
+            _fake.world.trigger_us = _fake.world.ticks_us()
+        self.value = value
+
+    def read_digital(self):
+        _fake.world.sleep_us(5)
+        if self.number == 15:
+            return _fake.world.echo_level()
+        return self.value
+
+    def write_analog(self, value):
+        self.value = value
+
+    def read_analog(self):
+        return self.value
+
+    def is_touched(self):
+        return self.number == 2 and _fake.world.touched
+
+
+class _Button:
+    def __init__(self, name):
+        self.name = name
+
+    def is_pressed(self):
+        return self.name in _fake.world.held
+
+    def was_pressed(self):
+        return _fake.world.was_pressed(self.name)
+
+
+class _Display:
+    def show(self, image, delay=400, wait=True, loop=False, clear=False):
+        _fake.world.show(str(image))
+
+    def scroll(self, text, delay=150, wait=True, loop=False, monospace=False):
+        text = str(text)
+        _fake.world.show(text)
+        if wait:
+            # About 6 columns per character
+            _fake.world.sleep_us(len(text) * 6 * delay * 1000)
+
+    def clear(self):
+        _fake.world.show('')
+
+    def set_pixel(self, x, y, value):
+        pass
+
+
+def sleep(ms):
+    _fake.world.sleep_us(int(ms * 1000))
+
+
+def running_time():
+    return _fake.world.ticks_us() // 1000
+
+
+i2c = _I2C()
+uart = _UART()
+display = _Display()
+button_a = _Button('a')
+button_b = _Button('b')
+for _number in range(21):
+    globals()['pin%d' % _number] = _Pin(_number)
@@ -0,0 +1,102 @@
+"""Sensors and actuators the maze robot uses.
+
+Robot in main3.py only reaches the car through a Hardware object, so the
+same code runs on the micro:bit and, with the fakemicrobit package, on a
+laptop against a simulated maze. Anything that takes time is a task for
+scheduler.py and yields while it waits.
+"""
+from microbit import display, uart
+from time import ticks_ms, ticks_diff
+from keyes_Bit_Car_Driver import Bit_Car_Driver
+from motion import CONTROL_MS, Profile, pwm_for
+
+# Task periods in ms: polling and display refresh
+POLL_MS = 20
+DISPLAY_MS = 50
+# The sensor sits about 4 cm ahead of the car's centre, so a wall on the
+# car's own cell reads about 5 cm and the next one out about 23 cm
+WALL_CM = 14
+# Pings per side, medianed, and the gap for stray echoes to die down
+PINGS = 3
+PING_GAP_MS = 10
+# Motor speed (0-255) for turns, and how long the car takes at that speed
+# to turn a quarter. ASSUMED, not yet measured on the car: time ten quarter
+# turns at DRIVE_SPEED on the maze floor to set TURN_MS. Straights follow
+# motion.Profile
+DRIVE_SPEED = 120
+TURN_MS = 350
+
+
+class Hardware:
+    """The Keyes car with its ultrasonic sensor"""
+    def __init__(self, car=None):
+        self.car = car if car is not None else Bit_Car_Driver()
+        # Latest text for the display task
+        self.message = ''
+
+    def wall_ahead(self):
+        """Task: ping the sensor a few times and return True if the median
+        distance puts a wall on the near side of the next cell"""
+        self.car.distance_filter.reset()
+        timeouts = self.car.timeouts
+        for _ in range(PINGS):
+            distance = self.car.get_distance()
+            yield PING_GAP_MS
+        # No echo at all means nothing in range
+        heard = self.car.timeouts - timeouts < PINGS
+        wall = heard and distance < WALL_CM
+        self.message = 'X' if wall else 'O'
+        return wall
+
+    def turn(self, quarters):
+        """Task: turn in place by quarters clockwise quarter turns, 3 is a
+        left turn"""
+        quarters %= 4
+        if not quarters:
+            return
+        # Wheels in opposite directions, motor state 1 is forward
+        if quarters == 3:
+            self.car.motors(0, DRIVE_SPEED, 1, DRIVE_SPEED)
+            yield TURN_MS
+        else:
+            self.car.motors(1, DRIVE_SPEED, 0, DRIVE_SPEED)
+            yield TURN_MS * quarters
+        self.car.motors(1, 0, 1, 0)
+
+    def forward(self, cells):
+        """Task: drive straight ahead cells cells as one move, speeding up,
+        cruising and slowing down to stop on the last cell"""
+        profile = Profile(cells)
+        duration = int(profile.duration * 1000)
+        start = ticks_ms()
+        pwm = None
+        elapsed = 0
+        while elapsed < duration:
+            step = min(CONTROL_MS, duration - elapsed)
+            # Speed at the middle of the step keeps the distance right on
+            # the ramps, and the motors are only written when it changes
+            new_pwm = int(pwm_for(profile.speed((elapsed + step / 2) / 1000)) + 0.5)
+            if new_pwm != pwm:
+                pwm = new_pwm
+                self.car.motors(1, pwm, 1, pwm)
+            yield step
+            elapsed = ticks_diff(ticks_ms(), start)
+        self.car.motors(1, 0, 1, 0)
+
+    def send(self, data):
+        """Write bytes to the USB serial port, which print() shares"""
+        uart.write(data)
+
+    def show_messages(self):
+        """Task: put the latest message on the display when it changes"""
+        shown = None
+        while True:
+            if self.message != shown:
+                shown = self.message
+                if len(shown) == 1:
+                    display.show(shown)
+                elif shown:
+                    display.scroll(shown, wait=False)
+                else:
+                    display.clear()
+            yield DISPLAY_MS
@@ -0,0 +1,143 @@
+"""Named counters and accumulating timers for the hot paths.
+
+Timing is switched on by instrument(), which swaps the named methods of a
+class for timed wrappers. Until then the methods are the plain originals
+so disabled instrumentation costs nothing, and count() is a single flag
+test. uninstall() puts the originals back. instrument_tasks() does the
+same for generator tasks, timing each from its first step until it
+returns.
+
+    instrument(MazeGrid, 'update_costs_flood_fill')
+    instrument_tasks(Hardware, 'forward', 'turn')
+    ...
+    dump()          # table, over serial on the robot
+    dump('json')
+
+Uses ticks_us on the robot and perf_counter_ns on the host. Runs under
+MicroPython and CPython.
+"""
+try:
+    from time import ticks_us as _ticks, ticks_diff as _diff
+    # Timer ticks per microsecond
+    TICKS_PER_US = 1
+except ImportError:
+    from time import perf_counter_ns as _ticks
+
+    def _diff(end, start):
+        return end - start
+    TICKS_PER_US = 1000
+
+enabled = False
+counters = {}
+# name -> [calls, total ticks, max ticks]
+timers = {}
+_installed = []
+
+
+def count(name, n=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+
+def accumulate(name, elapsed):
+    """Add one call taking elapsed ticks to the timer called name"""
+    timer = timers.setdefault(name, [0, 0, 0])
+    timer[0] += 1
+    timer[1] += elapsed
+    if elapsed > timer[2]:
+        timer[2] = elapsed
+
+
+def timed(function, name):
+    """Wrap function so each call adds to the timer called name"""
+    def wrapper(*args, **kwargs):
+        start = _ticks()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            accumulate(name, _diff(_ticks(), start))
+    return wrapper
+
+
+def timed_task(function, name):
+    """Wrap a generator function so each task it makes adds its time from
+    first step to return, including the time it spent waiting, to the
+    timer called name"""
+    def wrapper(*args, **kwargs):
+        start = _ticks()
+        try:
+            return (yield from function(*args, **kwargs))
+        finally:
+            accumulate(name, _diff(_ticks(), start))
+    return wrapper
+
+
+def _install(owner, names, wrap):
+    global enabled
+    enabled = True
+    label = getattr(owner, '__name__', 'object')
+    for name in names:
+        original = getattr(owner, name)
+        _installed.append((owner, name, original))
+        setattr(owner, name, wrap(original, label + '.' + name))
+
+
+def instrument(owner, *names):
+    """Time the named methods of a class (or functions of a module) as
+    Owner.name, and enable the counters"""
+    _install(owner, names, timed)
+
+
+def instrument_tasks(owner, *names):
+    """instrument() for methods that are generator tasks"""
+    _install(owner, names, timed_task)
+
+
+def uninstall():
+    global enabled
+    while _installed:
+        owner, name, original = _installed.pop()
+        setattr(owner, name, original)
+    enabled = False
+
+
+def reset():
+    counters.clear()
+    for timer in timers.values():
+        timer[0] = timer[1] = timer[2] = 0
+
+
+def summary():
+    """Timers as calls, total_us, mean_us and max_us, plus the counters"""
+    result = {}
+    for name in sorted(timers):
+        calls, total, longest = timers[name]
+        if calls:
+            result[name] = {'calls': calls,
+                            'total_us': total / TICKS_PER_US,
+                            'mean_us': total / calls / TICKS_PER_US,
+                            'max_us': longest / TICKS_PER_US}
+    for name in sorted(counters):
+        result[name] = {'count': counters[name]}
+    return result
+
+
+def dump(fmt='table', write=print):
+    """Write the summary as an aligned table or one line of JSON"""
+    stats = summary()
+    if fmt == 'json':
+        # Only imported when asked for, the micro:bit build may have no json
+        try:
+            import json
+        except ImportError:
+            import ujson as json
+        write(json.dumps(stats))
+        return
+    width = max([len(name) for name in stats] + [4])
+    write('%-*s %8s %12s %10s %10s' % (width, 'name', 'calls', 'total_us', 'mean_us', 'max_us'))
+    for name, row in stats.items():
+        if 'count' in row:
+            write('%-*s %8d' % (width, name, row['count']))
+        else:
+            write('%-*s %8d %12.0f %10.1f %10.0f' % (width, name, row['calls'], row['total_us'],
+                                                      row['mean_us'], row['max_us']))
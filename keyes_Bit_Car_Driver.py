@@ -1,40 +1,114 @@
 #from microbit import pin14, pin15, sleep, i2c, display
 from microbit import *
 import ustruct
-from time import sleep_us, ticks_us
-distance = 0
+from machine import time_pulse_us
+from time import sleep_us, ticks_us, ticks_diff
+
+# PCA9685 registers. With auto-increment (MODE1_AI) set, one transaction
+# writes a start register and then any number of consecutive registers,
+# so a channel's ON_L, ON_H, OFF_L, OFF_H go in a single write
+MODE1_AI = 0x20
+LED0_ON_L = 0x06
+ALL_LED_ON_L = 0xFA
+
+# Longest echo waited for, about 4 m which is the sensor's range. Missed
+# echoes are given up after this instead of stalling the caller
+ECHO_TIMEOUT_US = 24000
+# Centimetres per microsecond of echo, there and back at 340 m/s
+CM_PER_ECHO_US = 0.017
+# Ping states for poll mode
+PING_IDLE = 0
+PING_WAIT_ECHO = 1
+PING_ECHO = 2
+MEDIAN = 'median'
+EMA = 'ema'
+
+
+class DistanceFilter(object):
+    """Median or exponential moving average over the last few readings.
+
+    Readings go in a fixed ring buffer of size samples. The median rejects
+    single bad echoes, the EMA (weight alpha on the newest reading) reacts
+    faster with less memory of old readings.
+    """
+    def __init__(self, size=5, mode=MEDIAN, alpha=0.5):
+        self.samples = [0] * size
+        self.count = 0
+        self.index = 0
+        self.mode = mode
+        self.alpha = alpha
+        self.ema = 0
+
+    def add(self, value):
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % len(self.samples)
+        if self.count < len(self.samples):
+            self.count += 1
+        if self.count == 1:
+            self.ema = value
+        else:
+            self.ema += self.alpha * (value - self.ema)
+
+    def reset(self):
+        """Forget the readings, e.g. after turning to face something else"""
+        self.count = 0
+        self.index = 0
+
+    def value(self):
+        if self.mode == EMA or self.count < 3:
+            return self.ema
+        ordered = sorted(self.samples[:self.count])
+        return ordered[self.count // 2]
+
 
 class Bit_Car_Driver(object):
-    def __init__(self):
+    def __init__(self, distance_filter=None, echo_timeout_us=ECHO_TIMEOUT_US):
         self.add = 0x43
-        i2c.write(self.add, bytearray([0x00, 0x00]), repeat=False)
+        self.distance_filter = distance_filter or DistanceFilter()
+        self.echo_timeout_us = echo_timeout_us
+        # Latest filtered distance in cm, 0 until an echo is heard
+        self.distance = 0
+        self.timeouts = 0
+        self.ping_state = PING_IDLE
+        self.ping_time = 0
+        # Reused for single channel writes: register then on/off as <HH
+        self.buf = bytearray(5)
+        # Auto-increment is kept on in every MODE1 write from here
+        i2c.write(self.add, bytearray([0x00, MODE1_AI]), repeat=False)
         self.set_all_pwm(0, 0)
         i2c.write(self.add, bytearray([0x01, 0x04]), repeat=False)
-        i2c.write(self.add, bytearray([0x00, 0x01]), repeat=False)
+        i2c.write(self.add, bytearray([0x00, 0x01 | MODE1_AI]), repeat=False)
         sleep(5)
         i2c.write(self.add, bytearray([0x00]), repeat=False)
         mode1s = i2c.read(self.add, 1)
         #mode1 = ustruct.unpack('<H', mode1)[0]
         mode1 = mode1s[0]
-        mode1 = mode1 & ~0x10
+        mode1 = (mode1 & ~0x10) | MODE1_AI
         i2c.write(self.add, bytearray([0x00, mode1]), repeat=False)
         sleep(5)
 
     def set_pwm(self, channel, on, off):
+        """Set one channel in a single transaction, or read it back as
+        (on, off) when on or off is None"""
         if on is None or off is None:
-            i2c.writ(self.add, bytearray([0x06+4*channel]), repeat=False)
+            i2c.write(self.add, bytearray([LED0_ON_L+4*channel]), repeat=False)
             data = i2c.read(self.add, 4)
             return ustruct.unpack('<HH', data)
-        i2c.write(self.add, bytearray([0x06+4*channel, on & 0xFF]), repeat=False)
-        i2c.write(self.add, bytearray([0x07+4*channel, on >> 8]), repeat=False)
-        i2c.write(self.add, bytearray([0x08+4*channel, off & 0xFF]), repeat=False)
-        i2c.write(self.add, bytearray([0x09+4*channel, off >> 8]), repeat=False)
+        ustruct.pack_into('<BHH', self.buf, 0, LED0_ON_L+4*channel, on, off)
+        i2c.write(self.add, self.buf, repeat=False)
+
+    def set_pwm_channels(self, channel, values):
+        """Set consecutive channels from channel in a single transaction,
+        values is a list of (on, off) pairs"""
+        buf = bytearray(1 + 4*len(values))
+        buf[0] = LED0_ON_L+4*channel
+        for i in range(len(values)):
+            ustruct.pack_into('<HH', buf, 1+4*i, values[i][0], values[i][1])
+        i2c.write(self.add, buf, repeat=False)
 
     def set_all_pwm(self, on, off):
-        i2c.write(self.add, bytearray([0xFA, on & 0xFF]), repeat=False)
-        i2c.write(self.add, bytearray([0xFB, on >> 8]), repeat=False)
-        i2c.write(self.add, bytearray([0xFC, off & 0xFF]), repeat=False)
-        i2c.write(self.add, bytearray([0xFD, off >> 8]), repeat=False)
+        ustruct.pack_into('<BHH', self.buf, 0, ALL_LED_ON_L, on, off)
+        i2c.write(self.add, self.buf, repeat=False)
 
     def map(self, value, fromLow, fromHigh, toLow, toHigh):
         return (toHigh-toLow)*(value-fromLow) / (fromHigh-fromLow) + toLow
@@ -53,42 +127,93 @@ class Bit_Car_Driver(object):
         R = int(4095-(R/255)*4095)
         G = int(4095-(G/255)*4095)
         B = int(4095-(B/255)*4095)
-        self.set_pwm(6, 0, R)
-        self.set_pwm(5, 0, G)
-        self.set_pwm(4, 0, B)
+        # Channels 4, 5, 6 are blue, green, red
+        self.set_pwm_channels(4, [(0, B), (0, G), (0, R)])
+
+    def motor_pwm(self, state, speed):
+        """(on, off) pairs for a motor's direction and speed channels, state
+        1 is forward and 0 reverse, None for any other state"""
+        speed = int(self.map(speed, 0, 255, 0, 4095))
+        if (state == 1):
+            return [(0, 0), (0, speed)]
+        if (state == 0):
+            return [(4096, 0), (0, speed)]
+        return None
 
     def motorL(self, stateL, left1):
-        left = int(self.map(left1, 0, 255, 0, 4095))
-        if (stateL == 1):
-            self.set_pwm(0, 0, 0)
-            self.set_pwm(1, 0, left)
-        if (stateL == 0):
-            self.set_pwm(0, 4096, 0)
-            self.set_pwm(1, 0, left)
+        left = self.motor_pwm(stateL, left1)
+        if left:
+            self.set_pwm_channels(0, left)
 
     def motorR(self, stateR, right1):
-        right = int(self.map(right1, 0, 255, 0, 4095))
-        if (stateR == 1):
-            self.set_pwm(2, 0, 0)
-            self.set_pwm(3, 0, right)
-        if (stateR == 0):
-            self.set_pwm(2, 4096, 0)
-            self.set_pwm(3, 0, right)
+        right = self.motor_pwm(stateR, right1)
+        if right:
+            self.set_pwm_channels(2, right)
+
+    def motors(self, stateL, left1, stateR, right1):
+        """Set both motors at once, channels 0-3 in a single transaction so
+        the wheels change speed together"""
+        left = self.motor_pwm(stateL, left1)
+        right = self.motor_pwm(stateR, right1)
+        if left and right:
+            self.set_pwm_channels(0, left + right)
+        elif left:
+            self.set_pwm_channels(0, left)
+        elif right:
+            self.set_pwm_channels(2, right)
+
+    def start_ping(self):
+        """Send a trigger pulse and return straight away, poll_distance then
+        times the echo"""
+        pin14.write_digital(1)
+        sleep_us(15)
+        pin14.write_digital(0)
+        self.ping_state = PING_WAIT_ECHO
+        self.ping_time = ticks_us()
+
+    def poll_distance(self):
+        """Check on the ping from start_ping without blocking.
+
+        Returns None while the echo is still due, otherwise the filtered
+        distance. A missed echo times out after echo_timeout_us and returns
+        the previous distance. The echo is timed from the polls that see
+        its edges, so each edge can be late by up to a poll interval, and
+        every 100 us of poll interval is up to 1.7 cm of error. Polled
+        every 10-20 ms by the scheduler, readings can be off by 17-34 cm,
+        too coarse to place a wall. Only use poll mode for a rough
+        obstacle check, and get_distance for wall readings. Millimetre
+        accuracy needs polls about 6 us apart.
+        """
+        state = self.ping_state
+        if state == PING_IDLE:
+            return None
+        now = ticks_us()
+        level = pin15.read_digital()
+        if state == PING_WAIT_ECHO and level:
+            self.ping_state = PING_ECHO
+            self.ping_time = now
+        elif state == PING_ECHO and not level:
+            self.ping_state = PING_IDLE
+            return self.add_echo(ticks_diff(now, self.ping_time))
+        elif ticks_diff(now, self.ping_time) > self.echo_timeout_us:
+            self.ping_state = PING_IDLE
+            self.timeouts += 1
+            return self.distance
+        return None
 
     def get_distance(self):
-        global distance
-        for i in range(2):
-            pin14.write_digital(1)
-            sleep_us(15)
-            pin14.write_digital(0)
-            if pin15.read_digital() == 1:
-                ts = ticks_us()
-                while pin15.read_digital() == 1:
-                    pass
-                te = ticks_us()
-                tc = te - ts
-                distance = (tc*170)*0.0001
-                if(distance > 800):
-                    distance = 0
-        return round(distance, 2)
+        """Ping once and return the filtered distance in cm, blocking for at
+        most about twice echo_timeout_us. A missed echo returns the previous
+        distance."""
+        self.start_ping()
+        echo_us = time_pulse_us(pin15, 1, self.echo_timeout_us)
+        self.ping_state = PING_IDLE
+        if echo_us < 0:
+            self.timeouts += 1
+            return self.distance
+        return self.add_echo(echo_us)
 
+    def add_echo(self, echo_us):
+        self.distance_filter.add(echo_us * CM_PER_ECHO_US)
+        self.distance = round(self.distance_filter.value(), 2)
+        return self.distance
@@ -1,187 +1,630 @@
-
-from keyes_Bit_Car_Driver import *
-
-from collections import deque
-import array
-
-class MazeGrid:
-    def __init__(self):
-        self.size = 9
-        # Using lists instead of numpy arrays
-        self.costs = [[0 for _ in range(self.size)] for _ in range(self.size)]
-        self.explored = [[False for _ in range(self.size)] for _ in range(self.size)]
-        # walls[y][x] contains [N,E,S,W] walls
-        self.walls = [[[True for _ in range(4)] for _ in range(self.size)] for _ in range(self.size)]
-        self.known_walls = [[[False for _ in range(4)] for _ in range(self.size)] for _ in range(self.size)]
-        self.initialize_cost_grid()
-
-    def initialize_cost_grid(self):
-        center = self.size // 2
-        for i in range(self.size):
-            for j in range(self.size):
-                self.costs[i][j] = abs(i - center) + abs(j - center)
-
-    def update_costs_flood_fill(self):
-        # Initialize costs to high value (999 instead of infinity)
-        new_costs = [[999 for _ in range(self.size)] for _ in range(self.size)]
-        center = self.size // 2
-        new_costs[center][center] = 0
-
-        # Use queue for flood fill
-        queue = deque([(center, center)])
-
-        while queue:
-            y, x = queue.popleft()
-            current_cost = new_costs[y][x]
-
-            # Check all four directions
-            directions = [(0,-1), (1,0), (0,1), (-1,0)]  # N,E,S,W
-            for i, (dy, dx) in enumerate(directions):
-                new_y, new_x = y + dy, x + dx
-
-                # Check bounds and walls
-                if (0 <= new_x < self.size and 0 <= new_y < self.size and
-                    not self.known_walls[y][x][i]):
-                    new_cost = current_cost + 1
-
-                    # Update if new cost is lower
-                    if new_cost < new_costs[new_y][new_x]:
-                        new_costs[new_y][new_x] = new_cost
-                        queue.append((new_y, new_x))
-
-        # Update costs, using manhattan distance for unreachable cells
-        for y in range(self.size):
-            for x in range(self.size):
-                if new_costs[y][x] == 999:
-                    center = self.size // 2
-                    new_costs[y][x] = abs(y - center) + abs(x - center)
-
-        self.costs = new_costs
-
-    def mark_cell_explored(self, x, y):
-        self.explored[y][x] = True
-
-    def is_cell_explored(self, x, y):
-        return self.explored[y][x]
-
-    def set_wall(self, x, y, direction, value):
-        """Set wall and maintain consistency with neighboring cells"""
-        self.known_walls[y][x][direction] = value
-        if direction == 0 and y < self.size-1:  # North
-            self.known_walls[y+1][x][2] = value
-        elif direction == 1 and x < self.size-1:  # East
-            self.known_walls[y][x+1][3] = value
-        elif direction == 2 and y > 0:  # South
-            self.known_walls[y-1][x][0] = value
-        elif direction == 3 and x > 0:  # West
-            self.known_walls[y][x-1][1] = value
-
-class Robot:
-    def __init__(self, grid):
-        self.maze_grid = grid
-        self.position = [0, 0]
-
-    def scan_surrounding_walls(self):
-        # This should interface with actual robot sensors
-        # Return array of 4 booleans for N,E,S,W walls
-        # Example implementation (to be replaced with actual sensor code):
-
-        wall_bool = [False, False, False, False]
-
-        # N, if wall press A. Display E
-        directions = ['N','E','S','W']
-        for index in range(4):
-            display.scroll(directions[index])
-            while True:
-
-                if button_a.is_pressed():
-                    wall_bool[index] = True
-                    display.scroll("wall")
-                    break
-                elif button_b.is_pressed():
-                    wall_bool[index] = False
-                    display.scroll("no wall")
-                    break
-
-        # Or dance
-
-        return wall_bool
-
-
-
-    def update_grid_walls(self, walls):
-        x, y = self.position
-        for direction in range(4):
-            self.maze_grid.set_wall(x, y, direction, walls[direction])
-        self.maze_grid.update_costs_flood_fill()
-
-    def get_available_moves(self):
-        x, y = self.position
-        moves = []
-        walls = self.maze_grid.known_walls[y][x]
-
-        if not walls[0] and y < self.maze_grid.size-1: moves.append((x, y+1))
-        if not walls[1] and x < self.maze_grid.size-1: moves.append((x+1, y))
-        if not walls[2] and y > 0: moves.append((x, y-1))
-        if not walls[3] and x > 0: moves.append((x-1, y))
-
-        return moves
-
-    def find_lowest_cost_move(self, available_moves):
-        if not available_moves:
-            return self.position
-
-        unexplored_moves = [move for move in available_moves
-                          if not self.maze_grid.is_cell_explored(*move)]
-        moves_to_consider = unexplored_moves if unexplored_moves else available_moves
-
-        # Find move with lowest cost
-        min_cost = 999
-        best_move = moves_to_consider[0]
-        for x, y in moves_to_consider:
-            cost = self.maze_grid.costs[y][x]
-            if cost < min_cost:
-                min_cost = cost
-                best_move = (x, y)
-
-        return best_move
-
-    def move_to_cell(self, x, y):
-        # This should interface with actual robot motors
-        self.position = [x, y]
-        self.maze_grid.mark_cell_explored(x, y)
-
-def solve_maze():
-    maze_grid = MazeGrid()
-    robot = Robot(maze_grid)
-
-    goal_found = False
-    center = maze_grid.size // 2
-
-    while not goal_found:
-        detected_walls = robot.scan_surrounding_walls()
-        robot.update_grid_walls(detected_walls)
-        available_moves = robot.get_available_moves()
-
-        if not available_moves:
-            print("No available moves - maze is unsolvable!")
-            break
-
-        next_x, next_y = robot.find_lowest_cost_move(available_moves)
-        robot.move_to_cell(next_x, next_y)
-
-        if (next_x, next_y) == (center, center):
-            goal_found = True
-
-    return "Maze solved!" if goal_found else "Maze unsolvable!"
-
-while True:
-    # solve_maze() # To start maze solving
-
-    # Need to test scan_surrounding_walls and move_to_cell
-    maze_grid = MazeGrid()
-    robot = Robot(maze_grid)
-
-    detected_walls = robot.scan_surrounding_walls()
-
-    display.scroll(detected_walls)
+
+from keyes_Bit_Car_Driver import *
+import instrument
+from hal import Hardware, POLL_MS
+from runtrace import TraceWriter
+from scheduler import Scheduler, run_task, wait_until
+from speedrun import FORWARD, HEADINGS, TURN_QUARTERS, compile_commands, plan_speed_run
+from telemetry import TelemetryWriter
+
+from time import ticks_us, ticks_diff
+import array
+import gc
+
+UNREACHABLE = 999
+# (dy, dx) for each wall index N,E,S,W - north is +y, same as set_wall
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+# Cell byte layout: low nibble is a wall bit per side N,E,S,W, high nibble
+# is a "seen" bit per side, so an unknown side is different from an open one
+WALL_BITS = (0x01, 0x02, 0x04, 0x08)
+SEEN_BITS = (0x10, 0x20, 0x40, 0x80)
+OPPOSITE = (2, 3, 0, 1)
+# Quarter turns to face a side, by clockwise quarters from the heading
+TURN_STEPS = (0, 1, 2, 1)
+# Scratch flag bits per cell used by the flood fill
+GOAL = 0x01
+DIRTY = 0x02
+QUEUED = 0x04
+# Saved map file: magic, version, size, then 2 bits (seen, wall) for each
+# inner east edge and inner north edge, then 1 explored bit per cell
+MAP_FILE = 'maze.bin'
+MAP_MAGIC = b'MM'
+MAP_VERSION = 1
+
+def center_goal(size):
+    """Center cell for odd sizes, the center 2x2 block for even (competition) sizes"""
+    c = size // 2
+    if size % 2:
+        return [(c, c)]
+    return [(c-1, c-1), (c, c-1), (c-1, c), (c, c)]
+
+class MazeGrid:
+    def __init__(self, size=9, goal_cells=None):
+        self.size = size
+        # Goal region as a list of (x, y) cells
+        self.goal_cells = list(goal_cells) if goal_cells else center_goal(size)
+        cells = size * size
+        # Everything is flat, indexed by y * size + x
+        self.cells = bytearray(cells)
+        self.costs = array.array('H', bytes(2 * cells))
+        # Flood fill distances to the goal, UNREACHABLE where walled off.
+        # costs is the same but with manhattan distance for unreachable cells
+        self.distances = array.array('H', bytes(2 * cells))
+        self.explored = bytearray(cells)
+        # Offset to the neighbouring cell index for each side N,E,S,W
+        self.offsets = (size, 1, -size, -1)
+        # Preallocated flood fill buffers so updates don't touch the heap:
+        # a ring buffer of cell indices, a list of dirty cells (cell indices
+        # whose known walls changed since the last cost update), per-cell
+        # flags and the manhattan fallback for unreachable cells
+        # MicroPython's array has no itemsize, so the width is spelled out
+        index_type, width = ('B', 1) if cells <= 256 else ('H', 2)
+        self.queue = array.array(index_type, bytes(cells * width))
+        self.dirty = array.array(index_type, bytes(cells * width))
+        self.dirty_count = 0
+        self.flags = bytearray(cells)
+        self.manhattan_costs = bytearray(cells)
+        self.walls_removed = False
+        # Time taken by the last update_costs_flood_fill, in microseconds
+        self.last_update_us = 0
+        self.initialize_walls()
+        self.initialize_cost_grid()
+
+    def initialize_walls(self):
+        # The outer walls are always there, so they start out seen
+        size = self.size
+        for i in range(size):
+            self.cells[(size-1) * size + i] |= WALL_BITS[0] | SEEN_BITS[0]
+            self.cells[i * size + size-1] |= WALL_BITS[1] | SEEN_BITS[1]
+            self.cells[i] |= WALL_BITS[2] | SEEN_BITS[2]
+            self.cells[i * size] |= WALL_BITS[3] | SEEN_BITS[3]
+
+    def initialize_cost_grid(self):
+        # With no known walls the flood fill is just manhattan distance
+        for gx, gy in self.goal_cells:
+            self.flags[gy * self.size + gx] |= GOAL
+        for i in range(self.size):
+            for j in range(self.size):
+                k = i * self.size + j
+                self.manhattan_costs[k] = self.manhattan(j, i)
+                self.costs[k] = self.manhattan_costs[k]
+                self.distances[k] = self.manhattan_costs[k]
+
+    def manhattan(self, x, y):
+        """Manhattan distance to the nearest goal cell"""
+        return min(abs(y - gy) + abs(x - gx) for gx, gy in self.goal_cells)
+
+    def has_wall(self, x, y, direction):
+        """True for a known wall, unknown sides count as open"""
+        return bool(self.cells[y * self.size + x] & WALL_BITS[direction])
+
+    def wall_state(self, x, y, direction):
+        """True for a wall, False for open, None if that side hasn't been seen"""
+        cell = self.cells[y * self.size + x]
+        if not cell & SEEN_BITS[direction]:
+            return None
+        return bool(cell & WALL_BITS[direction])
+
+    def is_cell_seen(self, x, y):
+        """True once all four sides of the cell are known"""
+        return self.cells[y * self.size + x] & 0xF0 == 0xF0
+
+    def cost(self, x, y):
+        return self.costs[y * self.size + x]
+
+    def compute_flood_fill(self, dist=None):
+        """Full BFS from the goal, written in place into dist, an 'H' array
+        of a distance per cell, or distances if not given"""
+        cells = self.cells
+        offsets = self.offsets
+        if dist is None:
+            dist = self.distances
+        flags = self.flags
+        queue = self.queue
+        head = tail = 0
+
+        for i in range(len(dist)):
+            if flags[i] & GOAL:
+                dist[i] = 0
+                queue[tail] = i
+                tail += 1
+            else:
+                dist[i] = UNREACHABLE
+
+        # Every cell is queued at most once, so the queue never wraps here
+        while head < tail:
+            i = queue[head]
+            head += 1
+            new_cost = dist[i] + 1
+            walls = cells[i]
+
+            # Check all four directions, the outer walls keep us in bounds
+            for d in range(4):
+                if not walls & WALL_BITS[d]:
+                    j = i + offsets[d]
+                    # Update if new cost is lower
+                    if new_cost < dist[j]:
+                        dist[j] = new_cost
+                        queue[tail] = j
+                        tail += 1
+
+    def update_costs_flood_fill(self, full=False):
+        """Bring costs up to date with the walls set since the last call.
+
+        Adding walls only ever raises distances, so that case is repaired
+        locally around the dirty cells. Removing a wall (a corrected scan)
+        falls back to a full recompute.
+        """
+        start = ticks_us()
+        for n in range(self.dirty_count):
+            self.flags[self.dirty[n]] &= ~DIRTY
+        if full or self.walls_removed:
+            instrument.count('flood_fill_full')
+            self.compute_flood_fill()
+            for i in range(len(self.costs)):
+                self.refresh_cost(i)
+        elif self.dirty_count:
+            instrument.count('flood_fill_repair')
+            self.repair_distances()
+        self.dirty_count = 0
+        self.walls_removed = False
+        self.last_update_us = ticks_diff(ticks_us(), start)
+
+    def repair_distances(self):
+        """Modified flood fill around the dirty cells.
+
+        First pass uses the queue as a stack to invalidate every cell that
+        no longer has a neighbour one step closer to the goal, spreading to
+        the cells that depended on it. The invalidated cells are moved to the
+        dirty list. Second pass re-seeds them from their neighbours and
+        relaxes outwards through the ring buffer until nothing improves.
+        """
+        dist = self.distances
+        cells = self.cells
+        flags = self.flags
+        offsets = self.offsets
+        queue = self.queue
+        dirty = self.dirty
+        size = len(queue)
+
+        top = 0
+        for n in range(self.dirty_count):
+            queue[top] = dirty[n]
+            flags[dirty[n]] |= QUEUED
+            top += 1
+        invalid = 0
+        while top:
+            top -= 1
+            i = queue[top]
+            flags[i] &= ~QUEUED
+            d = dist[i]
+            if d == UNREACHABLE or flags[i] & GOAL:
+                continue
+            walls = cells[i]
+            supported = False
+            for k in range(4):
+                if not walls & WALL_BITS[k] and dist[i + offsets[k]] == d - 1:
+                    supported = True
+                    break
+            if supported:
+                continue
+            dist[i] = UNREACHABLE
+            # The dirty cells were all copied onto the stack, so the dirty
+            # list is free to hold the invalidated cells
+            dirty[invalid] = i
+            invalid += 1
+            for k in range(4):
+                j = i + offsets[k]
+                if (not walls & WALL_BITS[k] and dist[j] == d + 1
+                        and not flags[j] & QUEUED):
+                    flags[j] |= QUEUED
+                    queue[top] = j
+                    top += 1
+
+        head = tail = count = 0
+        for n in range(invalid):
+            i = dirty[n]
+            walls = cells[i]
+            for k in range(4):
+                if not walls & WALL_BITS[k] and dist[i + offsets[k]] + 1 < dist[i]:
+                    dist[i] = dist[i + offsets[k]] + 1
+            if dist[i] < UNREACHABLE:
+                flags[i] |= QUEUED
+                queue[tail] = i
+                tail = (tail + 1) % size
+                count += 1
+
+        while count:
+            i = queue[head]
+            head = (head + 1) % size
+            count -= 1
+            flags[i] &= ~QUEUED
+            new_cost = dist[i] + 1
+            walls = cells[i]
+            for k in range(4):
+                j = i + offsets[k]
+                if not walls & WALL_BITS[k] and dist[j] > new_cost:
+                    dist[j] = new_cost
+                    if not flags[j] & QUEUED:
+                        flags[j] |= QUEUED
+                        queue[tail] = j
+                        tail = (tail + 1) % size
+                        count += 1
+
+        for n in range(invalid):
+            self.refresh_cost(dirty[n])
+
+    def refresh_cost(self, i):
+        # Use manhattan distance for unreachable cells
+        d = self.distances[i]
+        if d == UNREACHABLE:
+            d = self.manhattan_costs[i]
+        self.costs[i] = d
+
+    def verify_costs(self):
+        """Check the incrementally maintained distances against a full BFS
+        into a scratch array, leaving the grid as it was. Allocates the
+        scratch array, so keep it out of the control loop."""
+        full = array.array('H', self.distances)
+        self.compute_flood_fill(full)
+        return full == self.distances
+
+    def mark_cell_explored(self, x, y):
+        self.explored[y * self.size + x] = 1
+
+    def is_cell_explored(self, x, y):
+        return self.explored[y * self.size + x] == 1
+
+    def set_wall(self, x, y, direction, value):
+        """Set wall and maintain consistency with neighboring cells"""
+        dy, dx = DIRECTIONS[direction]
+        if not (0 <= x + dx < self.size and 0 <= y + dy < self.size):
+            # Outer wall, always there whatever the sensor says
+            return
+        i = y * self.size + x
+        j = i + self.offsets[direction]
+        if bool(self.cells[i] & WALL_BITS[direction]) != bool(value):
+            self.mark_dirty(i)
+            self.mark_dirty(j)
+            if not value:
+                self.walls_removed = True
+        self._set_side(i, direction, value)
+        self._set_side(j, OPPOSITE[direction], value)
+
+    def pack_map(self):
+        """Known walls and explored cells bit-packed for saving to flash.
+        Outer walls aren't stored, so a 9x9 map takes 51 bytes."""
+        size = self.size
+        edges = 2 * size * (size - 1)
+        data = bytearray(4 + (2 * edges + size * size + 7) // 8)
+        data[0] = MAP_MAGIC[0]
+        data[1] = MAP_MAGIC[1]
+        data[2] = MAP_VERSION
+        data[3] = size
+        bit = 32
+        for direction, width, height in ((1, size - 1, size), (0, size, size - 1)):
+            for y in range(height):
+                for x in range(width):
+                    cell = self.cells[y * size + x]
+                    if cell & SEEN_BITS[direction]:
+                        data[bit >> 3] |= 1 << (bit & 7)
+                    if cell & WALL_BITS[direction]:
+                        data[(bit + 1) >> 3] |= 1 << ((bit + 1) & 7)
+                    bit += 2
+        for i in range(size * size):
+            if self.explored[i]:
+                data[bit >> 3] |= 1 << (bit & 7)
+            bit += 1
+        return data
+
+    def load_map(self, data):
+        """Apply a pack_map() image and plan the costs straight away.
+        Returns False, leaving the grid as it was, if data doesn't fit."""
+        size = self.size
+        if (len(data) != 4 + (4 * size * (size - 1) + size * size + 7) // 8
+                or data[0:2] != MAP_MAGIC or data[2] != MAP_VERSION or data[3] != size):
+            return False
+        bit = 32
+        for direction, width, height in ((1, size - 1, size), (0, size, size - 1)):
+            for y in range(height):
+                for x in range(width):
+                    if data[bit >> 3] & (1 << (bit & 7)):
+                        wall = data[(bit + 1) >> 3] & (1 << ((bit + 1) & 7))
+                        self.set_wall(x, y, direction, wall)
+                    bit += 2
+        for i in range(size * size):
+            self.explored[i] = 1 if data[bit >> 3] & (1 << (bit & 7)) else 0
+            bit += 1
+        self.update_costs_flood_fill(full=True)
+        return True
+
+    def mark_dirty(self, i):
+        if not self.flags[i] & DIRTY:
+            self.flags[i] |= DIRTY
+            self.dirty[self.dirty_count] = i
+            self.dirty_count += 1
+
+    def _set_side(self, i, direction, value):
+        if value:
+            self.cells[i] |= WALL_BITS[direction] | SEEN_BITS[direction]
+        else:
+            self.cells[i] = (self.cells[i] & ~WALL_BITS[direction]) | SEEN_BITS[direction]
+
+def save_map(grid, path=MAP_FILE):
+    """Write the grid's map to flash, False if the filesystem is full"""
+    try:
+        with open(path, 'wb') as f:
+            f.write(grid.pack_map())
+    except OSError:
+        return False
+    return True
+
+def load_map(size=9, goal_cells=None, path=MAP_FILE):
+    """MazeGrid with the map saved by an earlier run, blank if there isn't
+    one for this maze size"""
+    grid = MazeGrid(size, goal_cells)
+    try:
+        with open(path, 'rb') as f:
+            grid.load_map(f.read())
+    except OSError:
+        pass
+    return grid
+
+def grid_heap_bytes(size=9):
+    """Heap taken by a fresh MazeGrid, run on the micro:bit to check memory"""
+    gc.collect()
+    before = gc.mem_free()
+    grid = MazeGrid(size)
+    gc.collect()
+    used = before - gc.mem_free()
+    del grid
+    return used
+
+def profile_flood_fill(grid, calls=20):
+    """Average microseconds and heap bytes allocated per full flood fill"""
+    gc.collect()
+    gc.disable()
+    before = gc.mem_free()
+    total_us = 0
+    for _ in range(calls):
+        grid.update_costs_flood_fill(full=True)
+        total_us += grid.last_update_us
+    allocated = before - gc.mem_free()
+    gc.enable()
+    return total_us // calls, allocated // calls
+
+class Robot:
+    def __init__(self, grid, hardware=None):
+        self.maze_grid = grid
+        self.hardware = hardware if hardware is not None else Hardware()
+        self.position = [0, 0]
+        # 0-3 for N,E,S,W, the robot starts facing north
+        self.heading = 0
+        # Shared between the tasks in solve_maze
+        self.scan_requested = False
+        self.walls = None
+
+    def scan_surrounding_walls(self):
+        """Blocking scan for callers outside the scheduler"""
+        return run_task(self.scan_walls(), self.hardware.show_messages())
+
+    def scan_walls(self):
+        """Task: measure the sides of the current cell that aren't known
+        yet, turning the sensor to each in turn. Sides already known, from
+        the outer walls or a neighbour's scan, are taken from the grid.
+        Returns the N,E,S,W list of 4 booleans."""
+        x, y = self.position
+        walls = [self.maze_grid.wall_state(x, y, d) for d in range(4)]
+        unknown = [d for d in range(4) if walls[d] is None]
+        instrument.count('sides_known', 4 - len(unknown))
+        while unknown:
+            # Nearest side first: straight ahead, a quarter turn, then behind
+            direction = min(unknown, key=lambda d: TURN_STEPS[(d - self.heading) % 4])
+            unknown.remove(direction)
+            yield from self.turn_to(direction)
+            walls[direction] = yield from self.hardware.wall_ahead()
+            instrument.count('sides_measured')
+        return walls
+
+    def sense(self):
+        """Task: scan whenever the planner asks for walls"""
+        while True:
+            yield from wait_until(lambda: self.scan_requested, POLL_MS)
+            self.walls = yield from self.scan_walls()
+            self.scan_requested = False
+
+    def update_grid_walls(self, walls):
+        x, y = self.position
+        for direction in range(4):
+            self.maze_grid.set_wall(x, y, direction, walls[direction])
+        self.maze_grid.update_costs_flood_fill()
+
+    def get_available_moves(self):
+        x, y = self.position
+        moves = []
+        grid = self.maze_grid
+
+        if not grid.has_wall(x, y, 0) and y < grid.size-1: moves.append((x, y+1))
+        if not grid.has_wall(x, y, 1) and x < grid.size-1: moves.append((x+1, y))
+        if not grid.has_wall(x, y, 2) and y > 0: moves.append((x, y-1))
+        if not grid.has_wall(x, y, 3) and x > 0: moves.append((x-1, y))
+
+        return moves
+
+    def find_lowest_cost_move(self, available_moves):
+        if not available_moves:
+            return self.position
+
+        unexplored_moves = [move for move in available_moves
+                          if not self.maze_grid.is_cell_explored(*move)]
+        moves_to_consider = unexplored_moves if unexplored_moves else available_moves
+
+        # Find move with lowest cost
+        min_cost = 999
+        best_move = moves_to_consider[0]
+        for x, y in moves_to_consider:
+            cost = self.maze_grid.cost(x, y)
+            if cost < min_cost:
+                min_cost = cost
+                best_move = (x, y)
+
+        return best_move
+
+    def move_to_cell(self, x, y):
+        self.position = [x, y]
+        self.maze_grid.mark_cell_explored(x, y)
+
+    def turn_to(self, direction):
+        """Task: turn in place to face direction"""
+        yield from self.hardware.turn(direction - self.heading)
+        self.heading = direction
+
+    def run_commands(self, commands):
+        """Task: drive a compiled speed-run command list without replanning"""
+        for command, count in commands:
+            if command != FORWARD:
+                yield from self.hardware.turn(TURN_QUARTERS[command])
+                self.heading = (self.heading + TURN_QUARTERS[command]) % 4
+                continue
+            yield from self.hardware.forward(count)
+            dx, dy = HEADINGS[self.heading]
+            for _ in range(count):
+                self.move_to_cell(self.position[0] + dx, self.position[1] + dy)
+
+def instrument_hot_paths():
+    """Time the solver steps, the scan and drive tasks and the motor
+    driver's I2C calls"""
+    instrument.instrument(Robot, 'update_grid_walls', 'find_lowest_cost_move', 'move_to_cell')
+    instrument.instrument_tasks(Robot, 'scan_walls')
+    instrument.instrument_tasks(Hardware, 'wall_ahead', 'turn', 'forward')
+    instrument.instrument(MazeGrid, 'update_costs_flood_fill')
+    instrument.instrument(Bit_Car_Driver, 'set_pwm', 'set_pwm_channels',
+                          'set_all_pwm', 'get_distance')
+
+def explore(robot, maze_grid, trace=None, map_path=None, telemetry=None):
+    """Task: plan and move one cell per step until the goal is reached.
+    Returns True if the goal was found. Each step is recorded to trace and
+    queued on telemetry, if given, once the car has driven it, and the map
+    is saved to map_path after each drive that entered a new cell, so a
+    reset loses at most the straight being driven.
+
+    The planner runs ahead of the car through cells whose walls are all
+    known already: those steps don't need a scan, so moves in the same
+    direction are collected and driven as one straight, stopping only to
+    turn, to scan an unknown cell or at the goal.
+    """
+    # Steps planned straight ahead that the car hasn't driven yet, as
+    # (x, y, walls, cell byte, next cell, direction, planning_us, new cell)
+    pending = []
+
+    def drive():
+        """Task: drive the pending straight, then record its steps"""
+        if not pending:
+            return
+        yield from robot.hardware.forward(len(pending))
+        new_cell = False
+        for x, y, walls, cell, next_cell, direction, planning_us, new in pending:
+            if trace is not None:
+                trace.record(x, y, walls, next_cell, planning_us)
+            if telemetry is not None:
+                telemetry.step(x, y, cell, direction, planning_us)
+            new_cell |= new
+        del pending[:]
+        if map_path and new_cell:
+            save_map(maze_grid, map_path)
+
+    while True:
+        x, y = robot.position
+        if maze_grid.is_cell_seen(x, y):
+            detected_walls = [maze_grid.has_wall(x, y, d) for d in range(4)]
+        else:
+            # The car has to be on the cell to scan it
+            yield from drive()
+            robot.walls = None
+            robot.scan_requested = True
+            yield from wait_until(lambda: robot.walls is not None, POLL_MS)
+            detected_walls = robot.walls
+        start = ticks_us()
+        robot.update_grid_walls(detected_walls)
+        available_moves = robot.get_available_moves()
+
+        if not available_moves:
+            yield from drive()
+            print("No available moves - maze is unsolvable!")
+            return False
+
+        next_x, next_y = robot.find_lowest_cost_move(available_moves)
+        planning_us = ticks_diff(ticks_us(), start)
+        direction = HEADINGS.index((next_x - x, next_y - y))
+        if direction != robot.heading:
+            yield from drive()
+            yield from robot.turn_to(direction)
+        pending.append((x, y, detected_walls, maze_grid.cells[y * maze_grid.size + x],
+                        (next_x, next_y), direction, planning_us,
+                        not maze_grid.is_cell_explored(next_x, next_y)))
+        robot.move_to_cell(next_x, next_y)
+
+        if (next_x, next_y) in maze_grid.goal_cells:
+            yield from drive()
+            return True
+        yield 0
+
+def solve_maze(size=9, goal_cells=None, trace_path=None, profile=False, map_path=MAP_FILE,
+               hardware=None, telemetry=False):
+    """Explore with sensing, planning and display as cooperative tasks.
+    With profile, the hot paths are timed and summarised over serial.
+    Exploration resumes from the map saved in map_path, None for a blank
+    map that isn't saved. With telemetry, binary frames of each step and
+    the cost changes are streamed over serial for watch.py."""
+    if profile:
+        instrument_hot_paths()
+    maze_grid = load_map(size, goal_cells, map_path) if map_path else MazeGrid(size, goal_cells)
+    robot = Robot(maze_grid, hardware)
+    # Record every step to flash so the run can be replayed on a laptop
+    trace = TraceWriter(trace_path, size, maze_grid.goal_cells) if trace_path else None
+    stream = TelemetryWriter(size, maze_grid.goal_cells) if telemetry else None
+
+    scheduler = Scheduler()
+    scheduler.add(robot.sense(), 'sense')
+    scheduler.add(robot.hardware.show_messages(), 'display')
+    if stream is not None:
+        scheduler.add(stream.sender(robot.hardware.send, maze_grid.costs), 'telemetry')
+    planner = scheduler.add(explore(robot, maze_grid, trace, map_path, stream), 'explore')
+    scheduler.run(until=planner)
+    if stream is not None:
+        stream.flush(robot.hardware.send, maze_grid.costs)
+        stream.end(planner.result)
+        stream.flush(robot.hardware.send)
+    scheduler.report()
+    if profile:
+        instrument.dump()
+        instrument.uninstall()
+
+    if trace is not None:
+        trace.close()
+    return "Maze solved!" if planner.result else "Maze unsolvable!"
+
+def speed_run(maze_grid=None, size=9, goal_cells=None, hardware=None, map_path=MAP_FILE):
+    """Fast run from the start over the map explored by solve_maze, or
+    the map saved to flash when there's no maze_grid (after a reset)"""
+    if maze_grid is None:
+        maze_grid = load_map(size, goal_cells, map_path)
+    robot = Robot(maze_grid, hardware)
+    path, predicted = plan_speed_run(maze_grid)
+    if path is None:
+        return "No known route!"
+    run_task(robot.run_commands(compile_commands(path)))
+    return "Speed run done!"
+
+if __name__ == "__main__":
+    hardware = Hardware()
+    while True:
+        # solve_maze() # To start maze solving
+
+        # Need to test scan_surrounding_walls and move_to_cell
+        maze_grid = MazeGrid()
+        robot = Robot(maze_grid, hardware)
+
+        detected_walls = robot.scan_surrounding_walls()
+
+        display.scroll(detected_walls)
@@ -0,0 +1,240 @@
+"""Seeded maze generation and loading of standard maze files.
+
+Mazes are (size, size, 4) boolean wall arrays indexed [y, x, direction]
+with directions N,E,S,W and north = +y, the layout of MazeGrid.walls in
+the simulator.
+
+generate_maze carves a depth-first maze from a seed, the same maze
+Simulator.generate_random_maze always gave for that seed, and
+generate_mazes stacks many into one (count, size, size, 4) array.
+maze_corpus caches a generated batch on disk so benchmarks can reuse it.
+
+load_maze reads the file formats used by micromouse maze archives:
+
+  .txt  ASCII drawings with posts, e.g. 'o---o' or '+---+' rows and '|'
+        walls, north at the top
+  .num  one 'x y N E S W' line per cell with 0/1 walls
+  .maz  binary, one byte per cell column by column from the south-west
+        corner, bits N=1, E=2, S=4, W=8
+"""
+import os
+
+import numpy as np
+
+# (dx, dy) for each wall index N,E,S,W. The depth-first search tries
+# neighbours in this order, kept for seed compatibility with the mazes
+# generated before this module existed
+_CARVE = ((0, 1), (1, 0), (0, -1), (-1, 0))
+# Opposite side of each wall index N,E,S,W
+_OPPOSITE = (2, 3, 0, 1)
+
+
+def center_goal(size):
+    """Centre cell for odd sizes, the centre 2x2 for even sizes"""
+    c = size // 2
+    if size % 2:
+        return [(c, c)]
+    return [(c-1, c-1), (c, c-1), (c-1, c), (c, c)]
+
+
+class _Draws:
+    """RandomState.randint(n) results, drawn 32 bits at a time in blocks.
+
+    Matches the legacy bounded sampler (mask to the next power of two,
+    reject values over n - 1, no draw at all for n == 1) so mazes stay the
+    same as when every step called randint, without a numpy call per step.
+    """
+    def __init__(self, seed):
+        self.rng = np.random if seed is None else np.random.RandomState(seed)
+        self.block = []
+        self.index = 0
+
+    def randint(self, n):
+        if n == 1:
+            return 0
+        top = n - 1
+        mask = top
+        mask |= mask >> 1
+        mask |= mask >> 2
+        mask |= mask >> 4
+        mask |= mask >> 8
+        mask |= mask >> 16
+        while True:
+            if self.index == len(self.block):
+                self.block = self.rng.randint(0, 2**32, size=256, dtype=np.uint64).tolist()
+                self.index = 0
+            value = self.block[self.index] & mask
+            self.index += 1
+            if value <= top:
+                return value
+
+
+def generate_maze(size, seed=None, goal_cells=None, extra_paths=None):
+    """Depth-first maze from (0, 0) with the goal region opened up inside
+    and extra_paths (default size // 2) random walls knocked out, so it has
+    more than one route. seed None draws from numpy's global state."""
+    rng = _Draws(seed)
+    goal_cells = center_goal(size) if goal_cells is None else goal_cells
+    # Carved as wall bits per flat cell, N=1, E=2, S=4, W=8
+    cells = bytearray(b"\x0f" * (size * size))
+    offsets = (size, 1, -size, -1)
+
+    def carve(cell, direction):
+        cells[cell] &= ~(1 << direction)
+        cells[cell + offsets[direction]] &= ~(1 << _OPPOSITE[direction])
+
+    visited = bytearray(size * size)
+    visited[0] = 1
+    stack = [0]
+    candidates = [0] * 4
+    while stack:
+        cell = stack[-1]
+        y, x = divmod(cell, size)
+        count = 0
+        if y < size - 1 and not visited[cell + size]:
+            candidates[count] = 0
+            count += 1
+        if x < size - 1 and not visited[cell + 1]:
+            candidates[count] = 1
+            count += 1
+        if y > 0 and not visited[cell - size]:
+            candidates[count] = 2
+            count += 1
+        if x > 0 and not visited[cell - 1]:
+            candidates[count] = 3
+            count += 1
+        if count:
+            direction = candidates[rng.randint(count)]
+            carve(cell, direction)
+            cell += offsets[direction]
+            visited[cell] = 1
+            stack.append(cell)
+        else:
+            stack.pop()
+
+    # Goal region is open inside, like a competition maze center
+    goals = set(goal_cells)
+    for gx, gy in goal_cells:
+        if (gx+1, gy) in goals:
+            carve(gy * size + gx, 1)
+        if (gx, gy+1) in goals:
+            carve(gy * size + gx, 0)
+
+    for _ in range(size // 2 if extra_paths is None else extra_paths):
+        x = rng.randint(size)
+        y = rng.randint(size)
+        direction = rng.randint(4)
+        dx, dy = _CARVE[direction]
+        if 0 <= x + dx < size and 0 <= y + dy < size:
+            carve(y * size + x, direction)
+
+    bits = np.frombuffer(bytes(cells), dtype=np.uint8).reshape(size, size)
+    return (bits[..., None] >> np.arange(4) & 1).astype(bool)
+
+
+def generate_mazes(size, seeds, goal_cells=None):
+    """One maze per seed as a (len(seeds), size, size, 4) array"""
+    seeds = list(seeds)
+    mazes = np.empty((len(seeds), size, size, 4), dtype=bool)
+    for i, seed in enumerate(seeds):
+        mazes[i] = generate_maze(size, seed, goal_cells)
+    return mazes
+
+
+def maze_corpus(size, count, first_seed=0, cache_dir=None):
+    """Mazes for seeds first_seed.. first_seed+count-1, read from an .npz in
+    cache_dir when an earlier call already generated them"""
+    if cache_dir is None:
+        return generate_mazes(size, range(first_seed, first_seed + count))
+    path = os.path.join(cache_dir, "mazes_%d_%d_%d.npz" % (size, first_seed, count))
+    if os.path.exists(path):
+        with np.load(path) as data:
+            return data["walls"]
+    mazes = generate_mazes(size, range(first_seed, first_seed + count))
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez_compressed(path, walls=mazes)
+    return mazes
+
+
+def close_outer_walls(walls):
+    """Outer walls on, and each inner wall made the same from both sides"""
+    walls[-1, :, 0] = walls[0, :, 2] = True
+    walls[:, -1, 1] = walls[:, 0, 3] = True
+    walls[:-1, :, 0] |= walls[1:, :, 2]
+    walls[1:, :, 2] = walls[:-1, :, 0]
+    walls[:, :-1, 1] |= walls[:, 1:, 3]
+    walls[:, 1:, 3] = walls[:, :-1, 1]
+    return walls
+
+
+def parse_text_maze(text):
+    """Walls from an ASCII maze drawing with posts every 4 columns and
+    every 2 rows, north at the top"""
+    lines = [line.rstrip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    size = (len(lines) - 1) // 2
+    if size < 1 or len(lines) != 2 * size + 1:
+        raise ValueError("not a maze drawing: %d lines" % len(lines))
+    walls = np.zeros((size, size, 4), dtype=bool)
+
+    def char(row, column):
+        line = lines[row]
+        return line[column] if column < len(line) else " "
+
+    for y in range(size):
+        top = 2 * (size - y) - 2       # post row north of the cells
+        middle = top + 1
+        for x in range(size):
+            walls[y, x, 0] = char(top, 4 * x + 2) not in " "
+            walls[y, x, 2] = char(top + 2, 4 * x + 2) not in " "
+            walls[y, x, 3] = char(middle, 4 * x) not in " "
+            walls[y, x, 1] = char(middle, 4 * x + 4) not in " "
+    return close_outer_walls(walls)
+
+
+def parse_num_maze(text):
+    """Walls from 'x y N E S W' lines"""
+    rows = [[int(v) for v in line.split()] for line in text.splitlines() if line.strip()]
+    size = max(max(row[0], row[1]) for row in rows) + 1
+    if len(rows) != size * size:
+        raise ValueError("expected %d cells, got %d" % (size * size, len(rows)))
+    walls = np.zeros((size, size, 4), dtype=bool)
+    for x, y, north, east, south, west in rows:
+        walls[y, x] = north, east, south, west
+    return close_outer_walls(walls)
+
+
+def parse_maz(data):
+    """Walls from a binary .maz image"""
+    size = int(round(len(data) ** 0.5))
+    if size * size != len(data):
+        raise ValueError("%d bytes is not a square maze" % len(data))
+    cells = np.frombuffer(bytes(data), dtype=np.uint8).reshape(size, size)
+    # Stored column by column, cells[x, y]
+    walls = (cells.T[..., None] >> np.arange(4) & 1).astype(bool)
+    return close_outer_walls(walls)
+
+
+def load_maze(path):
+    """Wall array from a .txt, .num or .maz maze file"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".maz":
+        with open(path, "rb") as f:
+            return parse_maz(f.read())
+    with open(path) as f:
+        text = f.read()
+    if extension == ".num":
+        return parse_num_maze(text)
+    return parse_text_maze(text)
+
+
+def format_maze(walls):
+    """ASCII drawing of a wall array, the format parse_text_maze reads"""
+    size = walls.shape[0]
+    lines = []
+    for y in range(size - 1, -1, -1):
+        lines.append("o" + "".join("---o" if walls[y, x, 0] else "   o" for x in range(size)))
+        lines.append(("|" if walls[y, 0, 3] else " ") +
+                     "".join("   |" if walls[y, x, 1] else "    " for x in range(size)))
+    lines.append("o" + "".join("---o" if walls[0, x, 2] else "   o" for x in range(size)))
+    return "\n".join(lines) + "\n"
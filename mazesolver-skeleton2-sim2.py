@@ -1,287 +1,1298 @@
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-import time
-from collections import deque
-
-class MazeGrid:
-    def __init__(self):
-        self.size = 9
-        self.costs = np.zeros((self.size, self.size))
-        self.explored = np.zeros((self.size, self.size), dtype=bool)
-        self.walls = np.ones((self.size, self.size, 4), dtype=bool)  # N,E,S,W
-        self.known_walls = np.zeros((self.size, self.size, 4), dtype=bool)  # Walls that robot has seen
-        self.initialize_cost_grid()
-
-    def initialize_cost_grid(self):
-        # Start with simple Manhattan distance
-        center = self.size // 2
-        for i in range(self.size):
-            for j in range(self.size):
-                self.costs[i,j] = abs(i - center) + abs(j - center)
-
-    def update_costs_flood_fill(self):
-        # Initialize all costs to infinity except goal
-        new_costs = np.full((self.size, self.size), float('inf'))
-        center = self.size // 2
-        new_costs[center, center] = 0
-        
-        # Use queue for flood fill
-        queue = deque([(center, center)])
-        
-        while queue:
-            y, x = queue.popleft()
-            current_cost = new_costs[y, x]
-            
-            # Check all four directions
-            directions = [(0,-1), (1,0), (0,1), (-1,0)]  # N,E,S,W
-            for i, (dy, dx) in enumerate(directions):
-                new_y, new_x = y + dy, x + dx
-                
-                # Check bounds and walls
-                if (0 <= new_x < self.size and 0 <= new_y < self.size and
-                    not self.known_walls[y, x, i]):
-                    new_cost = current_cost + 1
-                    
-                    # Update if new cost is lower
-                    if new_cost < new_costs[new_y, new_x]:
-                        new_costs[new_y, new_x] = new_cost
-                        queue.append((new_y, new_x))
-        
-        # Update costs, keeping infinity values as manhattan distance
-        for y in range(self.size):
-            for x in range(self.size):
-                if new_costs[y,x] == float('inf'):
-                    center = self.size // 2
-                    new_costs[y,x] = abs(y - center) + abs(x - center)
-        
-        self.costs = new_costs
-
-    def mark_cell_explored(self, x, y):
-        self.explored[y,x] = True
-
-    def is_cell_explored(self, x, y):
-        return self.explored[y,x]
-
-    def set_wall(self, x, y, direction, value):
-        """Set wall and maintain consistency with neighboring cells"""
-        self.known_walls[y,x,direction] = value
-        if direction == 0 and y < self.size-1:  # North
-            self.known_walls[y+1,x,2] = value
-        elif direction == 1 and x < self.size-1:  # East
-            self.known_walls[y,x+1,3] = value
-        elif direction == 2 and y > 0:  # South
-            self.known_walls[y-1,x,0] = value
-        elif direction == 3 and x > 0:  # West
-            self.known_walls[y,x-1,1] = value
-
-class DraftRobot:
-    def __init__(self, grid):
-        self.maze_grid = grid
-        self.position = [0, 0]
-        
-    def scan_surrounding_walls(self):
-        print(f"Scanning walls at position {self.position}")
-        x, y = self.position
-        return self.maze_grid.walls[y,x]
-        
-    def update_grid_walls(self, walls):
-        print(f"Updating walls at position {self.position}: {walls}")
-        x, y = self.position
-        for direction in range(4):
-            self.maze_grid.set_wall(x, y, direction, walls[direction])
-        # Update costs based on new wall information
-        self.maze_grid.update_costs_flood_fill()
-        
-    def get_available_moves(self):
-        print(f"Getting available moves from position {self.position}")
-        x, y = self.position
-        moves = []
-        walls = self.maze_grid.known_walls[y,x]
-        
-        if not walls[0] and y < self.maze_grid.size-1: moves.append((x, y+1))
-        if not walls[1] and x < self.maze_grid.size-1: moves.append((x+1, y))
-        if not walls[2] and y > 0: moves.append((x, y-1))
-        if not walls[3] and x > 0: moves.append((x-1, y))
-        
-        print(f"Available moves: {moves}")
-        return moves
-        
-    def find_lowest_cost_move(self, available_moves):
-        print("Finding lowest cost move")
-        if not available_moves:
-            print("No moves available!")
-            return self.position
-            
-        unexplored_moves = [move for move in available_moves 
-                          if not self.maze_grid.is_cell_explored(*move)]
-        moves_to_consider = unexplored_moves if unexplored_moves else available_moves
-        costs = [self.maze_grid.costs[y,x] for x,y in moves_to_consider]
-        best_move = moves_to_consider[np.argmin(costs)]
-        
-        print(f"Selected move: {best_move}")
-        return best_move
-        
-    def move_to_cell(self, x, y):
-        print(f"Moving from {self.position} to ({x}, {y})")
-        self.position = [x, y]
-        self.maze_grid.mark_cell_explored(x, y)
-
-class Simulator:
-    def __init__(self, robot, maze_grid):
-        self.robot = robot
-        self.maze_grid = maze_grid
-        self.fig, self.ax = plt.subplots(figsize=(8, 8))
-        
-    def generate_random_maze(self):
-        """Generate a maze with multiple solutions using depth-first search"""
-        self.maze_grid.walls.fill(True)
-        
-        def get_unvisited_neighbors(x, y, visited):
-            neighbors = []
-            directions = [(0,1), (1,0), (0,-1), (-1,0)]
-            for dx, dy in directions:
-                new_x, new_y = x + dx, y + dy
-                if (0 <= new_x < self.maze_grid.size and 
-                    0 <= new_y < self.maze_grid.size and 
-                    (new_x, new_y) not in visited):
-                    neighbors.append((new_x, new_y))
-            return neighbors
-        
-        visited = set([(0, 0)])
-        stack = [(0, 0)]
-        
-        while stack:
-            x, y = stack[-1]
-            neighbors = get_unvisited_neighbors(x, y, visited)
-            
-            if neighbors:
-                next_x, next_y = neighbors[np.random.randint(len(neighbors))]
-                if next_x > x:
-                    self.maze_grid.walls[y,x,1] = False
-                    self.maze_grid.walls[y,next_x,3] = False
-                elif next_x < x:
-                    self.maze_grid.walls[y,x,3] = False
-                    self.maze_grid.walls[y,next_x,1] = False
-                elif next_y > y:
-                    self.maze_grid.walls[y,x,0] = False
-                    self.maze_grid.walls[next_y,x,2] = False
-                else:
-                    self.maze_grid.walls[y,x,2] = False
-                    self.maze_grid.walls[next_y,x,0] = False
-                    
-                stack.append((next_x, next_y))
-                visited.add((next_x, next_y))
-            else:
-                stack.pop()
-        
-        # Add extra paths
-        for _ in range(self.maze_grid.size // 2):
-            x = np.random.randint(self.maze_grid.size)
-            y = np.random.randint(self.maze_grid.size)
-            direction = np.random.randint(4)
-            
-            if direction == 0 and y < self.maze_grid.size-1:
-                self.maze_grid.walls[y,x,0] = False
-                self.maze_grid.walls[y+1,x,2] = False
-            elif direction == 1 and x < self.maze_grid.size-1:
-                self.maze_grid.walls[y,x,1] = False
-                self.maze_grid.walls[y,x+1,3] = False
-            elif direction == 2 and y > 0:
-                self.maze_grid.walls[y,x,2] = False
-                self.maze_grid.walls[y-1,x,0] = False
-            elif direction == 3 and x > 0:
-                self.maze_grid.walls[y,x,3] = False
-                self.maze_grid.walls[y,x-1,1] = False
-                
-    def draw(self):
-        self.ax.clear()
-        
-        # Draw grid
-        for y in range(self.maze_grid.size):
-            for x in range(self.maze_grid.size):
-                # Draw actual walls in light gray
-                if self.maze_grid.walls[y,x,0]:
-                    self.ax.plot([x, x+1], [y+1, y+1], 'lightgray', linewidth=2)
-                if self.maze_grid.walls[y,x,1]:
-                    self.ax.plot([x+1, x+1], [y, y+1], 'lightgray', linewidth=2)
-                if self.maze_grid.walls[y,x,2]:
-                    self.ax.plot([x, x+1], [y, y], 'lightgray', linewidth=2)
-                if self.maze_grid.walls[y,x,3]:
-                    self.ax.plot([x, x], [y, y+1], 'lightgray', linewidth=2)
-                    
-                # Draw known walls in black
-                if self.maze_grid.known_walls[y,x,0]:
-                    self.ax.plot([x, x+1], [y+1, y+1], 'k-', linewidth=2)
-                if self.maze_grid.known_walls[y,x,1]:
-                    self.ax.plot([x+1, x+1], [y, y+1], 'k-', linewidth=2)
-                if self.maze_grid.known_walls[y,x,2]:
-                    self.ax.plot([x, x+1], [y, y], 'k-', linewidth=2)
-                if self.maze_grid.known_walls[y,x,3]:
-                    self.ax.plot([x, x], [y, y+1], 'k-', linewidth=2)
-                    
-                # Draw costs
-                cost = self.maze_grid.costs[y,x]
-                self.ax.text(x+0.5, y+0.5, f'{int(cost)}',
-                           ha='center', va='center')
-                
-                # Color explored cells
-                if self.maze_grid.explored[y,x]:
-                    self.ax.add_patch(Rectangle((x, y), 1, 1, 
-                                    facecolor='lightgray', alpha=0.3))
-        
-        # Draw robot
-        robot_x, robot_y = self.robot.position
-        self.ax.add_patch(Rectangle((robot_x, robot_y), 1, 1, 
-                                  facecolor='red', alpha=0.5))
-        
-        # Draw goal
-        center = self.maze_grid.size // 2
-        self.ax.add_patch(Rectangle((center, center), 1, 1, 
-                                  facecolor='green', alpha=0.3))
-        
-        self.ax.grid(True)
-        self.ax.set_xlim(-0.5, self.maze_grid.size+0.5)
-        self.ax.set_ylim(-0.5, self.maze_grid.size+0.5)
-        self.ax.set_aspect('equal')
-        plt.pause(0.5)
-
-def solve_maze(robot_class=DraftRobot):
-    maze_grid = MazeGrid()
-    robot = robot_class(maze_grid)
-    
-    if robot_class == DraftRobot:
-        sim = Simulator(robot, maze_grid)
-        sim.generate_random_maze()
-    
-    goal_found = False
-    center = maze_grid.size // 2
-    
-    while not goal_found:
-        if robot_class == DraftRobot:
-            sim.draw()
-            
-        detected_walls = robot.scan_surrounding_walls()
-        robot.update_grid_walls(detected_walls)
-        available_moves = robot.get_available_moves()
-        
-        if not available_moves:
-            print("No available moves - maze is unsolvable!")
-            break
-            
-        next_x, next_y = robot.find_lowest_cost_move(available_moves)
-        robot.move_to_cell(next_x, next_y)
-        
-        if (next_x, next_y) == (center, center):
-            goal_found = True
-            
-        time.sleep(0.5)
-            
-    if robot_class == DraftRobot:
-        sim.draw()
-        plt.show()
-    
-    return "Maze solved!" if goal_found else "Maze unsolvable!"
-
-if __name__ == "__main__":
-    solve_maze(robot_class=DraftRobot)
\ No newline at end of file
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.patches import Rectangle
+from matplotlib.textpath import TextPath
+from matplotlib.transforms import Affine2D
+import time
+import argparse
+import csv
+import functools
+import json
+import multiprocessing
+from collections import deque
+
+import instrument
+from mazegen import center_goal, generate_maze, generate_mazes, load_maze
+from runtrace import TraceWriter
+from speedrun import (FORWARD, HEADINGS, TURN_QUARTERS, RunCosts, command_time,
+                      compile_commands, format_commands, plan_speed_run)
+
+UNREACHABLE = 999
+# (dy, dx) for each wall index N,E,S,W - north is +y, same as set_wall
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+# Quarter turns to face a side, by clockwise quarters from the heading
+TURN_STEPS = (0, 1, 2, 1)
+# Seconds to measure one side of a cell, hal.Hardware.wall_ahead's pings
+SCAN_TIME = 0.035
+# Competition time limit for all runs in the maze, in seconds
+TIME_LIMIT = 600
+
+class RobotClock:
+    """Virtual clock charging what each step would take the real robot.
+
+    Moves are merged into straights costed with the RunCosts trapezoid, as
+    main3.py drives them: the car only stops to turn, to scan a cell that
+    has unseen sides, or at the end. A scan turns to each unseen side,
+    nearest first, and measures it for scan_time. Planning is charged as
+    the measured host time times cpu_scale, how many times slower the
+    robot runs Python. elapsed is the total in seconds, breakdown the
+    share of each kind of work.
+    """
+    def __init__(self, costs=None, scan_time=SCAN_TIME, cpu_scale=1.0):
+        self.costs = costs if costs is not None else RunCosts()
+        self.scan_time = scan_time
+        self.cpu_scale = cpu_scale
+        self.heading = 0
+        # Cells driven since the last stop
+        self.straight = 0
+        self.elapsed = 0.0
+        self.breakdown = {"drive": 0.0, "turn": 0.0, "scan": 0.0, "plan": 0.0}
+
+    def charge(self, kind, seconds):
+        self.breakdown[kind] += seconds
+        self.elapsed += seconds
+
+    def stop(self):
+        if self.straight:
+            self.charge("drive", self.costs.straight(self.straight))
+            self.straight = 0
+
+    def turn_to(self, direction):
+        quarters = (direction - self.heading) % 4
+        if quarters:
+            self.stop()
+            self.charge("turn", self.costs.turn(quarters))
+            self.heading = direction
+
+    def scan(self, unseen):
+        """Measure the unseen sides, directions 0-3"""
+        unseen = list(unseen)
+        if unseen:
+            self.stop()
+        while unseen:
+            direction = min(unseen, key=lambda d: TURN_STEPS[(d - self.heading) % 4])
+            unseen.remove(direction)
+            self.turn_to(direction)
+            self.charge("scan", self.scan_time)
+
+    def plan(self, seconds):
+        self.charge("plan", seconds * self.cpu_scale)
+
+    def move(self, direction):
+        self.turn_to(direction)
+        self.straight += 1
+
+class MazeGrid:
+    def __init__(self, size=9, goal_cells=None):
+        self.size = size
+        # Goal region as a list of (x, y) cells
+        self.goal_cells = list(goal_cells) if goal_cells else center_goal(size)
+        self.costs = np.zeros((self.size, self.size))
+        # Flood fill distances to the goal, UNREACHABLE where walled off.
+        # costs is the same but with manhattan distance for unreachable cells
+        self.distances = np.zeros((self.size, self.size), dtype=int)
+        self.explored = np.zeros((self.size, self.size), dtype=bool)
+        self.walls = np.ones((self.size, self.size, 4), dtype=bool)  # N,E,S,W
+        self.known_walls = np.zeros((self.size, self.size, 4), dtype=bool)  # Walls that robot has seen
+        self.seen_walls = np.zeros((self.size, self.size, 4), dtype=bool)  # Sides that have been scanned
+        # Cells (y, x) whose known walls changed since the last cost update
+        self.dirty = set()
+        self.walls_removed = False
+        self.initialize_cost_grid()
+        # PathTable, made on first use of paths
+        self._paths = None
+
+    @property
+    def paths(self):
+        """Distances and routes between any two cells, see PathTable. Grids
+        that never look a route up don't pay for the table"""
+        if self._paths is None:
+            self._paths = PathTable(self)
+        return self._paths
+
+    def initialize_cost_grid(self):
+        # Start with simple Manhattan distance to the nearest goal cell
+        ys, xs = np.indices((self.size, self.size))
+        self.manhattan = np.min([np.abs(ys - gy) + np.abs(xs - gx)
+                                 for gx, gy in self.goal_cells], axis=0)
+        self.goal_mask = np.zeros((self.size, self.size), dtype=bool)
+        for gx, gy in self.goal_cells:
+            self.goal_mask[gy, gx] = True
+        self.costs[:] = self.manhattan
+        self.distances[:] = self.manhattan
+
+    def neighbor_table(self, walls=None):
+        """Flat index of the cell reached through each side N,E,S,W.
+
+        Returns a (size*size, 4) array, with size*size as a sentinel where a
+        wall (known_walls unless another walls array is given) or the maze
+        edge blocks that side.
+        """
+        n = self.size
+        cells = n * n
+        blocked = (self.known_walls if walls is None else walls).reshape(cells, 4)
+        index = np.arange(cells)
+        ys, xs = np.divmod(index, n)
+        return np.stack([
+            np.where((ys < n-1) & ~blocked[:, 0], index + n, cells),
+            np.where((xs < n-1) & ~blocked[:, 1], index + 1, cells),
+            np.where((ys > 0) & ~blocked[:, 2], index - n, cells),
+            np.where((xs > 0) & ~blocked[:, 3], index - 1, cells),
+        ], axis=1)
+
+    def compute_flood_fill(self, sources=None, walls=None):
+        """Wavefront flood fill from the goal, returns a new distances array.
+
+        Expands the whole frontier per step with array indexing instead of
+        visiting cells one at a time. Gives the same distances as
+        compute_flood_fill_bfs. sources is a boolean (size, size) mask to
+        flood from instead of the goal, walls a wall array to use instead
+        of known_walls.
+        """
+        cells = self.size * self.size
+        neighbors = self.neighbor_table(walls)
+        goal = np.flatnonzero(self.goal_mask if sources is None else sources)
+
+        # One extra slot for the sentinel so blocked sides are never relaxed
+        new_costs = np.full(cells + 1, UNREACHABLE, dtype=int)
+        new_costs[cells] = -1
+        new_costs[goal] = 0
+        frontier = goal
+        level = 0
+        while frontier.size:
+            level += 1
+            reached = neighbors[frontier].ravel()
+            reached = reached[new_costs[reached] == UNREACHABLE]
+            new_costs[reached] = level
+            frontier = np.unique(reached)
+
+        return new_costs[:cells].reshape(self.size, self.size)
+
+    def compute_flood_fill_bfs(self):
+        """Reference queue-based BFS, kept to cross-check the wavefront"""
+        new_costs = np.full((self.size, self.size), UNREACHABLE, dtype=int)
+        for gx, gy in self.goal_cells:
+            new_costs[gy, gx] = 0
+        
+        # Use queue for flood fill
+        queue = deque((gy, gx) for gx, gy in self.goal_cells)
+        
+        while queue:
+            y, x = queue.popleft()
+            new_cost = new_costs[y, x] + 1
+            
+            # Check all four directions
+            for i, (dy, dx) in enumerate(DIRECTIONS):
+                new_y, new_x = y + dy, x + dx
+                
+                # Check bounds and walls
+                if (0 <= new_x < self.size and 0 <= new_y < self.size and
+                    not self.known_walls[y, x, i]):
+                    # Update if new cost is lower
+                    if new_cost < new_costs[new_y, new_x]:
+                        new_costs[new_y, new_x] = new_cost
+                        queue.append((new_y, new_x))
+        
+        return new_costs
+
+    def update_costs_flood_fill(self, full=False):
+        """Bring costs up to date with the walls set since the last call.
+
+        Adding walls only ever raises distances, so that case is repaired
+        locally around the dirty cells. Removing a wall falls back to a full
+        recompute.
+        """
+        if full or self.walls_removed:
+            instrument.count("flood_fill_full")
+            self.distances = self.compute_flood_fill()
+            self.refresh_costs()
+        elif self.dirty:
+            instrument.count("flood_fill_repair")
+            self.refresh_costs(self.repair_distances())
+        self.dirty = set()
+        self.walls_removed = False
+
+    def _open_neighbors(self, y, x):
+        for i, (dy, dx) in enumerate(DIRECTIONS):
+            new_y, new_x = y + dy, x + dx
+            if (0 <= new_x < self.size and 0 <= new_y < self.size and
+                not self.known_walls[y, x, i]):
+                yield new_y, new_x
+
+    def repair_distances(self):
+        """Modified flood fill around the dirty cells, returns the cells it touched.
+
+        First pass invalidates every cell that no longer has a neighbour one
+        step closer to the goal, spreading to the cells that depended on
+        it. Second pass re-seeds the invalidated cells from their valid
+        neighbours and floods outwards in distance order.
+        """
+        dist = self.distances
+
+        stack = list(self.dirty)
+        invalid = []
+        while stack:
+            y, x = stack.pop()
+            d = dist[y, x]
+            if d == UNREACHABLE or self.goal_mask[y, x]:
+                continue
+            neighbors = list(self._open_neighbors(y, x))
+            if any(dist[ny, nx] == d - 1 for ny, nx in neighbors):
+                continue
+            dist[y, x] = UNREACHABLE
+            invalid.append((y, x))
+            stack.extend((ny, nx) for ny, nx in neighbors if dist[ny, nx] == d + 1)
+
+        buckets = {}
+        for y, x in invalid:
+            best = min((dist[ny, nx] + 1 for ny, nx in self._open_neighbors(y, x)),
+                       default=UNREACHABLE)
+            if best < UNREACHABLE:
+                buckets.setdefault(best, []).append((y, x))
+
+        level = min(buckets, default=0)
+        while buckets:
+            for y, x in buckets.pop(level, ()):
+                if dist[y, x] <= level:
+                    continue
+                dist[y, x] = level
+                for ny, nx in self._open_neighbors(y, x):
+                    if dist[ny, nx] > level + 1:
+                        buckets.setdefault(level + 1, []).append((ny, nx))
+            level += 1
+
+        return invalid
+
+    def refresh_costs(self, cells=None):
+        """Copy distances into costs, manhattan distance for unreachable cells"""
+        if cells is None:
+            self.costs[:] = np.where(self.distances == UNREACHABLE,
+                                     self.manhattan, self.distances)
+            return
+        if not cells:
+            return
+        ys, xs = np.array(cells).T
+        d = self.distances[ys, xs]
+        self.costs[ys, xs] = np.where(d == UNREACHABLE, self.manhattan[ys, xs], d)
+
+    def verify_costs(self):
+        """Check the incrementally maintained distances against a full recompute"""
+        return np.array_equal(self.distances, self.compute_flood_fill())
+
+    def has_wall(self, x, y, direction):
+        """True for a known wall or the maze edge, unknown sides count as open"""
+        dy, dx = DIRECTIONS[direction]
+        if not (0 <= x + dx < self.size and 0 <= y + dy < self.size):
+            return True
+        return bool(self.known_walls[y,x,direction])
+
+    def unseen_cells(self):
+        """Boolean mask of cells with a side, other than the maze edge, that
+        hasn't been scanned yet"""
+        unseen = ~self.seen_walls
+        unseen[-1, :, 0] = False
+        unseen[:, -1, 1] = False
+        unseen[0, :, 2] = False
+        unseen[:, 0, 3] = False
+        return unseen.any(axis=2)
+
+    def wall_state(self, x, y, direction):
+        """True for a wall, False for open, None if that side hasn't been seen"""
+        dy, dx = DIRECTIONS[direction]
+        if not (0 <= x + dx < self.size and 0 <= y + dy < self.size):
+            return True
+        if not self.seen_walls[y,x,direction]:
+            return None
+        return bool(self.known_walls[y,x,direction])
+
+    def mark_cell_explored(self, x, y):
+        self.explored[y,x] = True
+
+    def is_cell_explored(self, x, y):
+        return self.explored[y,x]
+
+    def set_wall(self, x, y, direction, value):
+        """Set wall and maintain consistency with neighboring cells"""
+        changed = self.known_walls[y,x,direction] != value
+        if changed:
+            self.dirty.add((y, x))
+            if not value:
+                self.walls_removed = True
+            if self._paths is not None:
+                self._paths.invalidate(x, y, direction, value)
+        self.known_walls[y,x,direction] = value
+        self.seen_walls[y,x,direction] = True
+        if direction == 0 and y < self.size-1:  # North
+            self.known_walls[y+1,x,2] = value
+            self.seen_walls[y+1,x,2] = True
+            if changed: self.dirty.add((y+1, x))
+        elif direction == 1 and x < self.size-1:  # East
+            self.known_walls[y,x+1,3] = value
+            self.seen_walls[y,x+1,3] = True
+            if changed: self.dirty.add((y, x+1))
+        elif direction == 2 and y > 0:  # South
+            self.known_walls[y-1,x,0] = value
+            self.seen_walls[y-1,x,0] = True
+            if changed: self.dirty.add((y-1, x))
+        elif direction == 3 and x > 0:  # West
+            self.known_walls[y,x-1,1] = value
+            self.seen_walls[y,x-1,1] = True
+            if changed: self.dirty.add((y, x-1))
+
+class PathTable:
+    """Distance and next-hop table between every pair of cells over known_walls.
+
+    Row t holds the flood fill from target cell t: distance[t, c] is the
+    number of cells from c to t (UNREACHABLE if walled off) and
+    next_hop[t, c] the direction N,E,S,W to drive from c towards t, NO_MOVE
+    at t itself or when t can't be reached. Cells are flat indices
+    y * size + x. Distances are uint16 and next hops uint8, 3 bytes per
+    pair, about 200 KB for a 16x16 maze.
+
+    MazeGrid makes the table on first use of grid.paths. Rows are only
+    computed when a lookup needs them, several at a time with
+    the same wavefront as MazeGrid.compute_flood_fill. MazeGrid.set_wall
+    calls invalidate, which marks stale just the rows whose shortest paths
+    the changed wall could alter, so a lookup after a scan redoes only the
+    targets in that part of the maze.
+    """
+    NO_MOVE = 4
+
+    def __init__(self, grid):
+        self.grid = grid
+        cells = grid.size * grid.size
+        self.distance = np.full((cells, cells), UNREACHABLE, dtype=np.uint16)
+        self.next_hop = np.full((cells, cells), self.NO_MOVE, dtype=np.uint8)
+        self.stale = np.ones(cells, dtype=bool)
+
+    def cell(self, x, y):
+        return y * self.grid.size + x
+
+    def invalidate(self, x, y, direction, value):
+        """Mark the rows a wall between (x, y) and its neighbour affects.
+
+        Called before the wall changes. Fresh rows are right for the old
+        walls, so a new wall matters to the targets whose distances on
+        either side of it differ by one, where the passage lies on one of
+        their shortest paths. An opened wall matters to the targets whose
+        distances across it differ by more than one, where it's a short cut.
+        """
+        dy, dx = DIRECTIONS[direction]
+        if self.stale.all() or not (0 <= x + dx < self.grid.size and
+                                    0 <= y + dy < self.grid.size):
+            return
+        gap = np.abs(self.distance[:, self.cell(x, y)].astype(int) -
+                     self.distance[:, self.cell(x + dx, y + dy)])
+        self.stale |= gap == 1 if value else gap > 1
+
+    def refresh(self, targets=None):
+        """Recompute the stale rows among targets (flat indices), all stale
+        rows if not given"""
+        rows = np.flatnonzero(self.stale)
+        if targets is not None:
+            rows = np.intersect1d(rows, targets)
+        if not rows.size:
+            return
+        instrument.count("path_rows", rows.size)
+        cells = self.stale.size
+        stride = cells + 1
+        count = rows.size
+        neighbors = np.empty((stride, 4), dtype=np.intp)
+        neighbors[:cells] = self.grid.neighbor_table()
+        neighbors[cells] = cells
+        # Every row in one flat index space, as in BatchMazeGrid, each row's
+        # cells followed by a sentinel slot. -2 there so it is never relaxed
+        # and never one less than a distance
+        base = np.arange(count) * stride
+        flat = (neighbors[None] + base[:, None, None]).reshape(count * stride, 4)
+        distance = np.full(count * stride, UNREACHABLE, dtype=int)
+        distance[base + cells] = -2
+        frontier = base + rows
+        distance[frontier] = 0
+        slot = np.empty(count * stride, dtype=np.intp)
+        level = 0
+        while frontier.size:
+            level += 1
+            reached = flat[frontier].ravel()
+            reached = reached[distance[reached] == UNREACHABLE]
+            distance[reached] = level
+            order = np.arange(reached.size)
+            slot[reached] = order
+            frontier = reached[slot[reached] == order]
+
+        # First side, in N,E,S,W order, whose neighbour is one step closer
+        distance = distance.reshape(count, stride)
+        own = distance[:, :cells]
+        closer = distance[:, neighbors[:cells]] == (own - 1)[:, :, None]
+        self.distance[rows] = own
+        self.next_hop[rows] = np.where(closer.any(axis=2), closer.argmax(axis=2), self.NO_MOVE)
+        self.stale[rows] = False
+
+    def distances_from(self, x, y):
+        """(size, size) distances from (x, y) to every cell, the same as
+        to it as passages go both ways"""
+        target = self.cell(x, y)
+        self.refresh([target])
+        return self.distance[target].reshape(self.grid.size, self.grid.size)
+
+    def next_move(self, position, target):
+        """Neighbouring cell to move to from position towards target, as
+        (x, y), or None if there or it can't be reached"""
+        x, y = position
+        row = self.cell(*target)
+        self.refresh([row])
+        direction = self.next_hop[row, self.cell(x, y)]
+        if direction == self.NO_MOVE:
+            return None
+        dy, dx = DIRECTIONS[direction]
+        return x + dx, y + dy
+
+    def nearest(self, position, mask):
+        """Cell (x, y) of mask closest to position, None if none is reachable"""
+        here = self.cell(*position)
+        self.refresh([here])
+        distance = np.where(mask.ravel(), self.distance[here], UNREACHABLE)
+        best = int(np.argmin(distance))
+        if distance[best] == UNREACHABLE:
+            return None
+        return best % self.grid.size, best // self.grid.size
+
+    def route(self, position, target):
+        """Cells from position to target, both included, None if unreachable"""
+        row = self.cell(*target)
+        self.refresh([row])
+        x, y = position
+        if self.distance[row, self.cell(x, y)] == UNREACHABLE:
+            return None
+        route = [(x, y)]
+        while (x, y) != tuple(target):
+            dy, dx = DIRECTIONS[self.next_hop[row, self.cell(x, y)]]
+            x, y = x + dx, y + dy
+            route.append((x, y))
+        return route
+
+    def route_to_goal(self, position):
+        """Route to the nearest goal cell, None if the goal is walled off"""
+        target = self.nearest(position, self.grid.goal_mask)
+        return None if target is None else self.route(position, target)
+
+    def route_to_start(self, position):
+        return self.route(position, (0, 0))
+
+    def route_to_unexplored(self, position):
+        """Route to the nearest cell not yet driven into, None if there's none"""
+        target = self.nearest(position, ~self.grid.explored)
+        return None if target is None else self.route(position, target)
+
+class DraftRobot:
+    def __init__(self, grid, verbose=True):
+        self.maze_grid = grid
+        self.position = [0, 0]
+        self.verbose = verbose
+
+    def log(self, message, *args):
+        # Formatting is deferred so headless runs don't pay for it
+        if self.verbose:
+            print(message % args if args else message)
+        
+    def scan_surrounding_walls(self):
+        self.log("Scanning walls at position %s", self.position)
+        x, y = self.position
+        return self.maze_grid.walls[y,x]
+        
+    def update_grid_walls(self, walls):
+        self.log("Updating walls at position %s: %s", self.position, walls)
+        x, y = self.position
+        for direction in range(4):
+            self.maze_grid.set_wall(x, y, direction, walls[direction])
+        # Update costs based on new wall information
+        self.maze_grid.update_costs_flood_fill()
+        
+    def get_available_moves(self):
+        self.log("Getting available moves from position %s", self.position)
+        x, y = self.position
+        moves = []
+        walls = self.maze_grid.known_walls[y,x]
+        
+        if not walls[0] and y < self.maze_grid.size-1: moves.append((x, y+1))
+        if not walls[1] and x < self.maze_grid.size-1: moves.append((x+1, y))
+        if not walls[2] and y > 0: moves.append((x, y-1))
+        if not walls[3] and x > 0: moves.append((x-1, y))
+        
+        self.log("Available moves: %s", moves)
+        return moves
+        
+    def find_lowest_cost_move(self, available_moves):
+        self.log("Finding lowest cost move")
+        if not available_moves:
+            self.log("No moves available!")
+            return self.position
+            
+        unexplored_moves = [move for move in available_moves 
+                          if not self.maze_grid.is_cell_explored(*move)]
+        moves_to_consider = unexplored_moves if unexplored_moves else available_moves
+        costs = [self.maze_grid.costs[y,x] for x,y in moves_to_consider]
+        best_move = moves_to_consider[np.argmin(costs)]
+        
+        self.log("Selected move: %s", best_move)
+        return best_move
+        
+    def move_to_cell(self, x, y):
+        self.log("Moving from %s to (%s, %s)", self.position, x, y)
+        self.position = [x, y]
+        self.maze_grid.mark_cell_explored(x, y)
+
+    def is_finished(self):
+        """Exploration ends as soon as the robot reaches the goal"""
+        return tuple(self.position) in self.maze_grid.goal_cells
+
+    def minimum_steps(self, shortest_path):
+        """Fewest cells any robot could drive to finish, given the true
+        shortest start to goal distance"""
+        return shortest_path
+
+    def run_commands(self, commands, heading=0):
+        """Drive a compiled speed-run command list without replanning.
+
+        Returns False if a real wall is in the way, which means the map the
+        route was planned on was wrong.
+        """
+        for command, count in commands:
+            if command != FORWARD:
+                heading = (heading + TURN_QUARTERS[command]) % 4
+                continue
+            for _ in range(count):
+                x, y = self.position
+                if self.maze_grid.walls[y,x,heading]:
+                    self.log("Hit a wall at (%s, %s) heading %s", x, y, heading)
+                    return False
+                dx, dy = HEADINGS[heading]
+                self.move_to_cell(x + dx, y + dy)
+        return True
+
+class ProvingRobot(DraftRobot):
+    """Keeps exploring after the goal until the shortest path is proven.
+
+    The path is proven once the best route over passages seen to be open is
+    as short as the best route with every unseen side assumed open, so no
+    unexplored cell could make it shorter. Until then the robot heads for
+    the nearest unscanned cell lying on some optimistic shortest path. Once
+    proven it drives back to the start, ready for the speed run.
+    """
+    def __init__(self, grid, verbose=True):
+        super().__init__(grid, verbose)
+        self.reached_goal = False
+        self.proven = False
+
+    def targets(self):
+        """Boolean mask of the cells the robot is heading for"""
+        grid = self.maze_grid
+        start = np.zeros((grid.size, grid.size), dtype=bool)
+        start[0, 0] = True
+        if not self.reached_goal:
+            return grid.goal_mask
+        optimistic = grid.distances
+        known = grid.compute_flood_fill(walls=grid.known_walls | ~grid.seen_walls)
+        if known[0, 0] == optimistic[0, 0]:
+            if not self.proven:
+                self.log("Shortest path proven: %s cells", known[0, 0])
+            self.proven = True
+            return start
+        from_start = grid.paths.distances_from(0, 0)
+        on_shortest = from_start + optimistic == optimistic[0, 0]
+        return on_shortest & grid.unseen_cells()
+
+    def find_lowest_cost_move(self, available_moves):
+        self.log("Finding move towards targets")
+        if not available_moves:
+            return self.position
+        targets = self.targets()
+        if self.proven:
+            # Home is a table lookup, no flood fill per step
+            best_move = self.maze_grid.paths.next_move(self.position, (0, 0))
+            if best_move is not None:
+                self.log("Selected move: %s", best_move)
+                return best_move
+        paths = self.maze_grid.paths
+        paths.refresh([paths.cell(x, y) for x, y in available_moves])
+        costs = [paths.distances_from(x, y)[targets].min(initial=UNREACHABLE)
+                 for x, y in available_moves]
+        best_move = available_moves[np.argmin(costs)]
+        self.log("Selected move: %s", best_move)
+        return best_move
+
+    def move_to_cell(self, x, y):
+        super().move_to_cell(x, y)
+        if (x, y) in self.maze_grid.goal_cells:
+            self.reached_goal = True
+
+    def is_finished(self):
+        return self.proven and self.position == [0, 0]
+
+    def minimum_steps(self, shortest_path):
+        # There and back again
+        return 2 * shortest_path
+
+ROBOTS = {"greedy": DraftRobot, "proving": ProvingRobot}
+
+# (dx, dy) steps for the sides N,E,S,W as arrays, for the batched robots
+STEP_X = np.array([dx for dx, dy in HEADINGS])
+STEP_Y = np.array([dy for dx, dy in HEADINGS])
+
+class BatchMazeGrid:
+    """Many mazes of one size and goal region as stacked arrays.
+
+    Every array has a leading batch dimension over the mazes: walls,
+    known_walls and seen_walls are (B, size, size, 4), distances, costs
+    and explored (B, size, size). Costs of every maze whose known walls
+    changed are recomputed together in one wavefront pass, and match what
+    MazeGrid keeps for the same walls.
+    """
+    def __init__(self, walls, goal_cells=None):
+        self.walls = np.asarray(walls, dtype=bool)
+        self.batch, self.size = self.walls.shape[:2]
+        # The goal and manhattan costs are the same for every maze
+        template = MazeGrid(self.size, goal_cells)
+        self.goal_cells = template.goal_cells
+        self.goal_mask = template.goal_mask
+        self.manhattan = template.manhattan
+        shape = (self.batch, self.size, self.size)
+        self.known_walls = np.zeros(shape + (4,), dtype=bool)
+        self.seen_walls = np.zeros(shape + (4,), dtype=bool)
+        self.explored = np.zeros(shape, dtype=bool)
+        self.distances = np.broadcast_to(self.manhattan, shape).astype(int)
+        self.costs = self.distances.astype(float)
+        # Mazes whose known walls changed since the last cost update
+        self.dirty = np.zeros(self.batch, dtype=bool)
+
+    def set_walls(self, mazes, xs, ys, walls):
+        """set_wall for the four sides of cell (xs[i], ys[i]) of maze
+        mazes[i], walls being (len(mazes), 4)"""
+        n = self.size
+        known = self.known_walls
+        self.dirty[mazes] |= (known[mazes, ys, xs] != walls).any(axis=1)
+        known[mazes, ys, xs] = walls
+        self.seen_walls[mazes, ys, xs] = True
+        for direction, (dy, dx) in enumerate(DIRECTIONS):
+            ny, nx = ys + dy, xs + dx
+            inside = (ny >= 0) & (ny < n) & (nx >= 0) & (nx < n)
+            opposite = (direction + 2) % 4
+            known[mazes[inside], ny[inside], nx[inside], opposite] = walls[inside, direction]
+            self.seen_walls[mazes[inside], ny[inside], nx[inside], opposite] = True
+
+    def compute_flood_fill(self, mazes, walls=None):
+        """Wavefront flood fill from the goal in all the given mazes at once,
+        returns (len(mazes), size, size) distances.
+
+        Cells of every maze share one flat index space, each maze's cells
+        followed by a sentinel slot that blocked sides point to, so a
+        frontier step is a single neighbour lookup across the whole batch.
+        walls is a (B, size, size, 4) array to use instead of known_walls.
+        """
+        n = self.size
+        cells = n * n
+        stride = cells + 1
+        count = len(mazes)
+        blocked = (self.known_walls if walls is None else walls)[mazes].reshape(count, cells, 4)
+        index = np.arange(cells)
+        ys, xs = np.divmod(index, n)
+        base = (np.arange(count) * stride)[:, None]
+        sentinel = base + cells
+        neighbors = np.empty((count, stride, 4), dtype=np.intp)
+        neighbors[:, cells] = sentinel
+        neighbors[:, :cells] = np.stack([
+            np.where((ys < n-1) & ~blocked[..., 0], base + index + n, sentinel),
+            np.where((xs < n-1) & ~blocked[..., 1], base + index + 1, sentinel),
+            np.where((ys > 0) & ~blocked[..., 2], base + index - n, sentinel),
+            np.where((xs > 0) & ~blocked[..., 3], base + index - 1, sentinel),
+        ], axis=2)
+        neighbors = neighbors.reshape(count * stride, 4)
+
+        new_costs = np.full(count * stride, UNREACHABLE, dtype=int)
+        new_costs[sentinel.ravel()] = -1
+        frontier = (base + np.flatnonzero(self.goal_mask)).ravel()
+        new_costs[frontier] = 0
+        # Cells reached twice in a step are dropped from the frontier by
+        # keeping the copy whose position was written last, cheaper than
+        # sorting for np.unique
+        slot = np.empty(count * stride, dtype=np.intp)
+        level = 0
+        while frontier.size:
+            level += 1
+            reached = neighbors[frontier].ravel()
+            reached = reached[new_costs[reached] == UNREACHABLE]
+            new_costs[reached] = level
+            order = np.arange(reached.size)
+            slot[reached] = order
+            frontier = reached[slot[reached] == order]
+
+        return new_costs.reshape(count, stride)[:, :cells].reshape(count, n, n)
+
+    def update_costs_flood_fill(self):
+        """Recompute distances and costs of the mazes with new walls"""
+        mazes = np.flatnonzero(self.dirty)
+        if not mazes.size:
+            return
+        instrument.count("flood_fill_batch")
+        distances = self.compute_flood_fill(mazes)
+        self.distances[mazes] = distances
+        self.costs[mazes] = np.where(distances == UNREACHABLE, self.manhattan, distances)
+        self.dirty[mazes] = False
+
+class BatchDraftRobot:
+    """DraftRobot's steps for every maze of a BatchMazeGrid in lockstep.
+
+    positions holds each robot's x, y. Robots drop out of active once they
+    are done, and every step works on the active robots only, in the order
+    of np.flatnonzero(active). Moves are chosen exactly as DraftRobot
+    chooses them, so each robot drives the same route it would alone.
+    """
+    def __init__(self, grid):
+        self.maze_grid = grid
+        self.positions = np.zeros((grid.batch, 2), dtype=int)
+        self.active = np.ones(grid.batch, dtype=bool)
+
+    def _active(self):
+        mazes = np.flatnonzero(self.active)
+        x, y = self.positions[mazes].T
+        return mazes, x, y
+
+    def scan_surrounding_walls(self):
+        mazes, x, y = self._active()
+        return self.maze_grid.walls[mazes, y, x]
+
+    def update_grid_walls(self, walls):
+        mazes, x, y = self._active()
+        self.maze_grid.set_walls(mazes, x, y, walls)
+        self.maze_grid.update_costs_flood_fill()
+
+    def get_available_moves(self):
+        """(active robots, 4) mask of the open sides N,E,S,W"""
+        mazes, x, y = self._active()
+        n = self.maze_grid.size
+        inside = np.stack([y < n-1, x < n-1, y > 0, x > 0], axis=1)
+        return ~self.maze_grid.known_walls[mazes, y, x] & inside
+
+    def find_lowest_cost_move(self, available_moves):
+        """Next x, y for each active robot: the cheapest unexplored open
+        neighbour, else the cheapest open one, the first in N,E,S,W order
+        on a tie. Robots with no move stay where they are."""
+        mazes, x, y = self._active()
+        grid = self.maze_grid
+        n = grid.size
+        tx = np.clip(x[:, None] + STEP_X, 0, n-1)
+        ty = np.clip(y[:, None] + STEP_Y, 0, n-1)
+        unexplored = available_moves & ~grid.explored[mazes[:, None], ty, tx]
+        consider = np.where(unexplored.any(axis=1, keepdims=True), unexplored, available_moves)
+        costs = np.where(consider, grid.costs[mazes[:, None], ty, tx], np.inf)
+        choice = np.argmin(costs, axis=1)
+        rows = np.arange(len(mazes))
+        moves = np.stack([tx[rows, choice], ty[rows, choice]], axis=1)
+        stuck = ~available_moves.any(axis=1)
+        moves[stuck] = self.positions[mazes[stuck]]
+        return moves
+
+    def move_to_cell(self, moves):
+        mazes = np.flatnonzero(self.active)
+        self.positions[mazes] = moves
+        self.maze_grid.explored[mazes, moves[:, 1], moves[:, 0]] = True
+
+    def is_finished(self):
+        """Which active robots stand on a goal cell"""
+        mazes, x, y = self._active()
+        return self.maze_grid.goal_mask[y, x]
+
+def wall_segments(walls):
+    """Line segments for a (size, size, 4) wall array, each shared wall once"""
+    ys, xs = np.nonzero(walls[:, :, 0])
+    north = [((x, y+1), (x+1, y+1)) for y, x in zip(ys, xs)]
+    ys, xs = np.nonzero(walls[:, :, 1])
+    east = [((x+1, y), (x+1, y+1)) for y, x in zip(ys, xs)]
+    # South and west sides are the neighbour's north and east, apart from
+    # the bottom row and left column
+    south = [((x, 0), (x+1, 0)) for x in np.flatnonzero(walls[0, :, 2])]
+    west = [((0, y), (0, y+1)) for y in np.flatnonzero(walls[:, 0, 3])]
+    return north + east + south + west
+
+class Simulator:
+    def __init__(self, robot, maze_grid, headless=False, fps=2, frame_skip=1,
+                 show_costs=None):
+        """fps caps the redraw rate (None for as fast as possible) and
+        frame_skip only renders every n-th draw() call. Cost labels are shown
+        for mazes up to 16x16 unless show_costs says otherwise."""
+        if frame_skip < 1:
+            raise ValueError("frame_skip must be at least 1, got %d" % frame_skip)
+        self.robot = robot
+        self.maze_grid = maze_grid
+        # Headless simulators never open a figure and draw() does nothing
+        self.headless = headless
+        self.fps = fps
+        self.frame_skip = frame_skip
+        self.show_costs = maze_grid.size <= 16 if show_costs is None else show_costs
+        self.frame = 0
+        self.last_frame = 0.0
+        self.artists = None
+        if not headless:
+            self.fig, self.ax = plt.subplots(figsize=(8, 8))
+        
+    def generate_random_maze(self, seed=None):
+        """Generate a maze with multiple solutions using depth-first search,
+        the same maze for the same seed, see mazegen.generate_maze"""
+        self.maze_grid.walls[...] = generate_maze(self.maze_grid.size, seed,
+                                                  self.maze_grid.goal_cells)
+
+    def load_maze(self, path):
+        """Use a maze file (.txt, .num or .maz) of the grid's size"""
+        walls = load_maze(path)
+        if walls.shape != self.maze_grid.walls.shape:
+            raise ValueError("%s is %dx%d, the grid is %dx%d" % (
+                path, walls.shape[0], walls.shape[0], self.maze_grid.size, self.maze_grid.size))
+        self.maze_grid.walls[...] = walls
+
+    def setup_artists(self):
+        """Create every artist once. Walls, goal and grid are static and go
+        in the blitting background, the rest is animated and updated in place"""
+        size = self.maze_grid.size
+        ax = self.ax
+        ax.clear()
+        ax.grid(True)
+        ax.set_xlim(-0.5, size+0.5)
+        ax.set_ylim(-0.5, size+0.5)
+        ax.set_aspect('equal')
+
+        # Actual walls in light gray, the maze doesn't change during a run
+        ax.add_collection(LineCollection(wall_segments(self.maze_grid.walls),
+                                         colors='lightgray', linewidths=2))
+        for gx, gy in self.maze_grid.goal_cells:
+            ax.add_patch(Rectangle((gx, gy), 1, 1, facecolor='green', alpha=0.3))
+
+        # Explored and cost shading as one mesh of cell quads, recoloured
+        # each frame. Much cheaper to draw than resampling an imshow image
+        edges = np.arange(size + 1)
+        shading = ax.pcolormesh(edges, edges, np.zeros((size, size)), animated=True)
+        # Colours are set directly, not through the colormap
+        shading.set_array(None)
+        known = LineCollection([], colors='k', linewidths=2, animated=True)
+        ax.add_collection(known)
+        robot = Rectangle((0, 0), 1, 1, facecolor='red', alpha=0.5, animated=True)
+        ax.add_patch(robot)
+        self.artists = {"shading": shading, "known": known, "robot": robot}
+
+        # Cost labels as one collection of cached glyph outlines, one path
+        # per cell, rather than a Text artist each
+        if self.show_costs:
+            ys, xs = np.indices((size, size))
+            self.glyphs = {}
+            self.glyph_size = min(10, 130 / size)
+            labels = PathCollection([], offsets=np.column_stack([xs.ravel() + 0.5,
+                                                                 ys.ravel() + 0.5]),
+                                    offset_transform=ax.transData,
+                                    facecolors='k', edgecolors='none', animated=True)
+            labels.set_transform(Affine2D().scale(self.fig.dpi / 72))
+            ax.add_collection(labels)
+            self.artists["labels"] = labels
+        self.label_values = None
+        # Known walls as last drawn
+        self.drawn_walls = None
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        self.fig.canvas.draw()
+
+    def glyph(self, value):
+        """Centred outline of a cost label, cached per value"""
+        if value not in self.glyphs:
+            path = TextPath((0, 0), str(value), size=self.glyph_size)
+            box = path.get_extents()
+            self.glyphs[value] = path.transformed(
+                Affine2D().translate(-(box.x0 + box.x1) / 2, -(box.y0 + box.y1) / 2))
+        return self.glyphs[value]
+
+    def animated_artists(self):
+        return list(self.artists.values())
+
+    def on_draw(self, event):
+        # Full redraws (first show, resize) refresh the blitting background
+        canvas = self.fig.canvas
+        if getattr(canvas, 'supports_blit', False):
+            self.background = canvas.copy_from_bbox(self.ax.bbox)
+        for artist in self.animated_artists():
+            self.ax.draw_artist(artist)
+
+    def update_artists(self):
+        grid = self.maze_grid
+        artists = self.artists
+
+        # Cost shading with explored cells grayed over it
+        finite = grid.costs[grid.costs < UNREACHABLE]
+        scale = finite.max() if finite.size and finite.max() > 0 else 1
+        shading = plt.cm.Blues(grid.costs / scale * 0.6)
+        shading[..., 3] = 0.25
+        shading[grid.explored] = (0.83, 0.83, 0.83, 0.5)
+        artists["shading"].set_facecolor(shading.reshape(-1, 4))
+
+        # Walls can be removed as well as added, so compare the whole array
+        if self.drawn_walls is None or not np.array_equal(grid.known_walls, self.drawn_walls):
+            artists["known"].set_segments(wall_segments(grid.known_walls))
+            self.drawn_walls = grid.known_walls.copy()
+
+        artists["robot"].set_xy(tuple(self.robot.position))
+
+        if "labels" in artists:
+            values = grid.costs.astype(int)
+            if self.label_values is None or not np.array_equal(values, self.label_values):
+                artists["labels"].set_paths([self.glyph(v) for v in values.ravel()])
+                self.label_values = values
+
+    def draw(self, force=False):
+        """Render the current state, honouring frame_skip and fps"""
+        if self.headless:
+            return
+        self.frame += 1
+        if not force and self.frame % self.frame_skip:
+            return
+        if self.artists is None:
+            self.setup_artists()
+        self.update_artists()
+
+        canvas = self.fig.canvas
+        if self.background is not None:
+            canvas.restore_region(self.background)
+            for artist in self.animated_artists():
+                self.ax.draw_artist(artist)
+            canvas.blit(self.ax.bbox)
+        else:
+            canvas.draw_idle()
+
+        # Keep the window responsive while pacing to the frame rate
+        wait = 0.0
+        if self.fps:
+            wait = 1.0 / self.fps - (time.perf_counter() - self.last_frame)
+        if wait > 0:
+            canvas.start_event_loop(wait)
+        else:
+            canvas.flush_events()
+        self.last_frame = time.perf_counter()
+
+def explore(robot, maze_grid, sim=None, delay=0, max_steps=None, trace=None, clock=None):
+    """Drive the robot until it is finished exploring, returns run statistics.
+
+    steps is the number of cells driven, min_steps the fewest a robot that
+    already knew the maze would need to finish the same job.
+
+    planning_time is the wall-clock time spent in update_grid_walls,
+    get_available_moves and find_lowest_cost_move, in seconds. Each step is
+    recorded to trace, a runtrace.TraceWriter, when one is given.
+
+    predicted_time is how long the real robot would take, from clock (a
+    RobotClock with the default costs if not given). The run itself goes
+    at full speed unless delay, in seconds per step, slows it down.
+    """
+    if clock is None:
+        clock = RobotClock()
+    goal_found = False
+    steps = 0
+    planning_time = 0.0
+    
+    while not goal_found:
+        if max_steps is not None and steps >= max_steps:
+            break
+        if sim is not None:
+            sim.draw()
+            
+        x, y = robot.position
+        clock.scan([d for d in range(4) if maze_grid.wall_state(x, y, d) is None])
+        detected_walls = robot.scan_surrounding_walls()
+        start = time.perf_counter()
+        robot.update_grid_walls(detected_walls)
+        available_moves = robot.get_available_moves()
+        
+        if not available_moves:
+            robot.log("No available moves - maze is unsolvable!")
+            break
+            
+        next_x, next_y = robot.find_lowest_cost_move(available_moves)
+        step_time = time.perf_counter() - start
+        planning_time += step_time
+        clock.plan(step_time)
+        if trace is not None:
+            trace.record(x, y, detected_walls, (next_x, next_y), step_time * 1e6)
+        clock.move(HEADINGS.index((next_x - x, next_y - y)))
+        robot.move_to_cell(next_x, next_y)
+        steps += 1
+        
+        if robot.is_finished():
+            goal_found = True
+            
+        if delay:
+            time.sleep(delay)
+    clock.stop()
+
+    shortest_path = maze_grid.compute_flood_fill(walls=maze_grid.walls)[0, 0]
+    return {
+        "steps": steps,
+        "min_steps": int(robot.minimum_steps(shortest_path)),
+        "cells_explored": int(np.count_nonzero(maze_grid.explored)),
+        "planning_time": planning_time,
+        "predicted_time": clock.elapsed,
+        "success": goal_found,
+    }
+
+def explore_batch(robot, maze_grid, max_steps=None):
+    """explore() for a BatchDraftRobot, all robots stepping together until
+    each has reached the goal, run out of moves or driven max_steps cells.
+    Returns one statistics row per maze like explore()'s, planning_time
+    being the batch's time shared out evenly."""
+    count = maze_grid.batch
+    steps = np.zeros(count, dtype=int)
+    success = np.zeros(count, dtype=bool)
+    start = time.perf_counter()
+    while True:
+        if max_steps is not None:
+            robot.active &= steps < max_steps
+        if not robot.active.any():
+            break
+        robot.update_grid_walls(robot.scan_surrounding_walls())
+        available_moves = robot.get_available_moves()
+        moves = robot.find_lowest_cost_move(available_moves)
+        # Robots with nowhere to go stop there, unsolved
+        stuck = ~available_moves.any(axis=1)
+        robot.active[np.flatnonzero(robot.active)[stuck]] = False
+        robot.move_to_cell(moves[~stuck])
+        steps[robot.active] += 1
+        finished = np.flatnonzero(robot.active)[robot.is_finished()]
+        success[finished] = True
+        robot.active[finished] = False
+    planning_time = (time.perf_counter() - start) / count
+
+    shortest_path = maze_grid.compute_flood_fill(np.arange(count), walls=maze_grid.walls)[:, 0, 0]
+    cells_explored = np.count_nonzero(maze_grid.explored.reshape(count, -1), axis=1)
+    return [{
+        "steps": int(steps[i]),
+        "min_steps": int(shortest_path[i]),
+        "cells_explored": int(cells_explored[i]),
+        "planning_time": planning_time,
+        "success": bool(success[i]),
+    } for i in range(count)]
+
+def speed_run(robot, maze_grid, sim=None):
+    """Second run from the start on the explored map, returns run statistics.
+
+    Plans the fastest route over passages seen during exploration and runs
+    it as compiled motion commands with no replanning on the way.
+    """
+    robot.position = [0, 0]
+    path, predicted = plan_speed_run(maze_grid)
+    if path is None:
+        robot.log("No known route to the goal")
+        return {"speed_run_success": False, "speed_run_time": None,
+                "speed_run_commands": 0}
+    commands = compile_commands(path)
+    robot.log("Speed run: %s", format_commands(commands))
+    arrived = robot.run_commands(commands)
+    if sim is not None:
+        sim.draw(force=True)
+    return {
+        "speed_run_success": arrived and tuple(robot.position) in maze_grid.goal_cells,
+        "speed_run_time": command_time(commands),
+        "speed_run_commands": len(commands),
+    }
+
+def instrument_hot_paths(robot_class=DraftRobot):
+    """Time the robot's steps and the flood fill, see instrument.dump()"""
+    instrument.instrument(robot_class, "scan_surrounding_walls", "update_grid_walls",
+                          "find_lowest_cost_move", "move_to_cell")
+    instrument.instrument(MazeGrid, "update_costs_flood_fill", "compute_flood_fill",
+                          "repair_distances", "refresh_costs")
+    instrument.instrument(PathTable, "refresh")
+
+def solve_maze(robot_class=DraftRobot, size=9, goal_cells=None, headless=False, seed=None,
+               speed=False, fps=2, frame_skip=1, trace_path=None, profile=None,
+               maze_path=None, cpu_scale=1.0, scan_time=SCAN_TIME):
+    """Explore a random maze, headless runs skip plotting, sleeping and logging.
+    With speed, a speed run on the explored map follows a successful search.
+    Visual runs are paced by the renderer's fps and frame_skip. The
+    exploration is recorded to trace_path for replay.py when given. profile,
+    "table" or "json", prints where the exploration's time went. maze_path
+    runs a maze file instead of a random maze, its size overrides size.
+    Visual runs log the real robot's predicted time, see RobotClock for
+    cpu_scale and scan_time."""
+    maze = None
+    if maze_path:
+        maze = load_maze(maze_path)
+        size = maze.shape[0]
+    maze_grid = MazeGrid(size, goal_cells)
+    robot = robot_class(maze_grid, verbose=not headless)
+    
+    sim = None
+    if issubclass(robot_class, DraftRobot):
+        sim = Simulator(robot, maze_grid, headless=headless, fps=fps,
+                        frame_skip=frame_skip)
+        if maze is not None:
+            maze_grid.walls[...] = maze
+        else:
+            sim.generate_random_maze(seed)
+    
+    trace = None
+    if trace_path:
+        trace = TraceWriter(trace_path, maze_grid.size, maze_grid.goal_cells,
+                            maze_grid.walls)
+    if profile:
+        instrument_hot_paths(robot_class)
+    clock = RobotClock(scan_time=scan_time, cpu_scale=cpu_scale)
+    result = explore(robot, maze_grid, sim, trace=trace, clock=clock)
+    if profile:
+        instrument.uninstall()
+        instrument.dump(profile)
+    if trace is not None:
+        trace.close()
+    # Logged, so headless runs and --profile json output stay quiet
+    total = clock.elapsed
+    robot.log("Predicted exploration %.1f s: %s", clock.elapsed, ", ".join(
+        "%s %.1f s" % item for item in clock.breakdown.items()))
+    if speed and result["success"]:
+        result.update(speed_run(robot, maze_grid, sim))
+        if result["speed_run_time"] is not None:
+            total += result["speed_run_time"]
+            robot.log("Predicted speed run %.1f s", result["speed_run_time"])
+    robot.log("Predicted total %.1f s of the %d s limit%s", total, TIME_LIMIT,
+              "" if total <= TIME_LIMIT else ", OVER")
+            
+    if sim is not None and not headless:
+        sim.draw(force=True)
+        plt.show()
+    
+    return "Maze solved!" if result["success"] else "Maze unsolvable!"
+
+def run_seeded_maze(seed, size=9, goal_cells=None, robot_class=DraftRobot, speed=False,
+                    cpu_scale=1.0, scan_time=SCAN_TIME):
+    """Headless run of one seeded random maze, returns a result row"""
+    maze_grid = MazeGrid(size, goal_cells)
+    robot = robot_class(maze_grid, verbose=False)
+    sim = Simulator(robot, maze_grid, headless=True)
+    sim.generate_random_maze(seed)
+    clock = RobotClock(scan_time=scan_time, cpu_scale=cpu_scale)
+    result = explore(robot, maze_grid, max_steps=10 * size * size, clock=clock)
+    if speed:
+        result.update(speed_run(robot, maze_grid) if result["success"] else
+                      {"speed_run_success": False, "speed_run_time": None,
+                       "speed_run_commands": 0})
+    return dict(seed=seed, size=size, **result)
+
+def run_batch(count, size=9, goal_cells=None, first_seed=0, workers=None, speed=False,
+              robot_class=DraftRobot, cpu_scale=1.0, scan_time=SCAN_TIME):
+    """Run count seeded mazes across a process pool, one result row per maze"""
+    seeds = range(first_seed, first_seed + count)
+    job = functools.partial(run_seeded_maze, size=size, goal_cells=goal_cells,
+                            robot_class=robot_class, speed=speed, cpu_scale=cpu_scale,
+                            scan_time=scan_time)
+    with multiprocessing.Pool(workers) as pool:
+        return pool.map(job, seeds)
+
+def run_lockstep(count, size=9, goal_cells=None, first_seed=0):
+    """Run count seeded mazes as one batch of greedy robots in lockstep,
+    the same result rows run_batch gives for DraftRobot without a speed
+    run, less the predicted time"""
+    seeds = range(first_seed, first_seed + count)
+    maze_grid = BatchMazeGrid(generate_mazes(size, seeds, goal_cells), goal_cells)
+    robot = BatchDraftRobot(maze_grid)
+    rows = explore_batch(robot, maze_grid, max_steps=10 * size * size)
+    return [dict(seed=seed, size=size, **row) for seed, row in zip(seeds, rows)]
+
+def compare_lockstep(count, size=9, first_seed=0):
+    """Maze-steps per second of run_lockstep against running the same
+    mazes one at a time in this process, and whether they agree"""
+    start = time.perf_counter()
+    batched = run_lockstep(count, size, first_seed=first_seed)
+    batched_time = time.perf_counter() - start
+    start = time.perf_counter()
+    looped = [run_seeded_maze(seed, size) for seed in range(first_seed, first_seed + count)]
+    looped_time = time.perf_counter() - start
+    steps = sum(row["steps"] for row in batched)
+    same = all(a["steps"] == b["steps"] and a["cells_explored"] == b["cells_explored"]
+               and a["success"] == b["success"] for a, b in zip(batched, looped))
+    return {"maze_steps": steps,
+            "lockstep_steps_per_s": steps / batched_time,
+            "loop_steps_per_s": steps / looped_time,
+            "speedup": looped_time / batched_time,
+            "same_results": same}
+
+def write_results(rows, path):
+    """Write batch rows as JSON if path ends in .json, CSV otherwise"""
+    with open(path, "w", newline="") as f:
+        if path.endswith(".json"):
+            json.dump(rows, f, indent=1)
+        else:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micromouse maze solver simulator")
+    parser.add_argument("--size", type=int, default=9)
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random maze seed, or first seed of a batch")
+    parser.add_argument("--headless", action="store_true",
+                        help="no plotting, sleeping or logging")
+    parser.add_argument("--batch", type=int, default=0, metavar="N",
+                        help="run N seeded mazes headless across a process pool")
+    parser.add_argument("--speed", action="store_true",
+                        help="follow exploration with a speed run on the known map")
+    parser.add_argument("--policy", choices=sorted(ROBOTS), default="greedy",
+                        help="exploration policy: stop at the goal, or prove the shortest path")
+    parser.add_argument("--fps", type=float, default=2,
+                        help="frame rate cap for visual runs, 0 for no cap")
+    parser.add_argument("--frame-skip", type=int, default=1,
+                        help="render every n-th step of visual runs")
+    parser.add_argument("--maze", default=None, metavar="FILE",
+                        help="run a .txt, .num or .maz maze file instead of a random maze")
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="record the exploration to a binary trace for replay.py")
+    parser.add_argument("--profile", choices=["table", "json"], default=None,
+                        help="print time spent per solver step after the run")
+    parser.add_argument("--cpu-scale", type=float, default=1.0,
+                        help="how many times slower the robot plans than this machine, "
+                             "for the predicted run time")
+    parser.add_argument("--scan-time", type=float, default=SCAN_TIME,
+                        help="seconds the robot takes to measure one side of a cell")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--lockstep", action="store_true",
+                        help="run the batch as one array of greedy robots stepping together, "
+                             "and report maze-steps/s against running each maze in turn")
+    parser.add_argument("--out", default="results.csv",
+                        help="batch results file, .csv or .json")
+    args = parser.parse_args()
+    if args.frame_skip < 1:
+        parser.error("--frame-skip must be at least 1")
+
+    if args.batch and args.lockstep:
+        if args.policy != "greedy" or args.speed:
+            parser.error("--lockstep runs the greedy policy without --speed")
+        stats = compare_lockstep(args.batch, args.size, first_seed=args.seed or 0)
+        print(f"{stats['maze_steps']} maze-steps: {stats['lockstep_steps_per_s']:.0f}/s in "
+              f"lockstep, {stats['loop_steps_per_s']:.0f}/s one maze at a time "
+              f"({stats['speedup']:.1f}x), results "
+              f"{'identical' if stats['same_results'] else 'DIFFERENT'}")
+    elif args.batch:
+        start = time.perf_counter()
+        rows = run_batch(args.batch, args.size, first_seed=args.seed or 0,
+                         workers=args.workers, speed=args.speed,
+                         robot_class=ROBOTS[args.policy], cpu_scale=args.cpu_scale,
+                         scan_time=args.scan_time)
+        write_results(rows, args.out)
+        solved = sum(row["success"] for row in rows)
+        steps = sum(row["steps"] for row in rows)
+        min_steps = sum(row["min_steps"] for row in rows)
+        predicted = [row["predicted_time"] + (row.get("speed_run_time") or 0) for row in rows]
+        over = sum(t > TIME_LIMIT for t in predicted)
+        print(f"{solved}/{len(rows)} solved in {time.perf_counter() - start:.1f}s, "
+              f"{steps / min_steps:.2f}x the minimum cells driven, results in {args.out}")
+        print(f"predicted robot time {np.mean(predicted):.1f}s mean, {max(predicted):.1f}s "
+              f"worst, {over} over the {TIME_LIMIT}s limit")
+    else:
+        print(solve_maze(robot_class=ROBOTS[args.policy], size=args.size,
+                         headless=args.headless, seed=args.seed, speed=args.speed,
+                         fps=args.fps, frame_skip=args.frame_skip,
+                         trace_path=args.trace, profile=args.profile,
+                         maze_path=args.maze, cpu_scale=args.cpu_scale,
+                         scan_time=args.scan_time))
@@ -0,0 +1,62 @@
+"""Speed profiles for straight moves.
+
+A straight of any number of cells is driven as one move that speeds up,
+cruises and slows down to stop on the last cell's centre, with the same
+limits speedrun.RunCosts plans with, so a planned run takes the time it
+was costed at. Wheel speeds are turned into motor PWM through a
+calibration table, which holds placeholder values until it's measured on
+the car.
+"""
+from speedrun import RunCosts
+
+# Wheel speed in cells/s for motor PWM values (0-255). UNCALIBRATED: these
+# are placeholders, speed proportional to PWM at 1 cell per 600 ms at PWM
+# 120, the same model the fake car uses. To measure, drive the car straight
+# over several cells of the maze floor at each PWM and divide the cells by
+# the seconds taken. Add a (PWM, 0.0) entry at the highest PWM that doesn't
+# move the car, so the motor deadband is skipped
+CALIBRATION = ((0, 0.0), (60, 0.833), (120, 1.667), (180, 2.5), (255, 3.542))
+# How often the PWM is updated along a profile, in ms
+CONTROL_MS = 20
+
+
+class Profile:
+    """Trapezoidal (or triangular, when too short to reach max speed)
+    speed profile for cells cells from stop to stop"""
+    def __init__(self, cells, costs=None):
+        if costs is None:
+            costs = RunCosts()
+        self.cells = cells
+        self.acceleration = costs.acceleration / costs.cell_length
+        max_speed = costs.max_speed / costs.cell_length
+        ramp = max_speed * max_speed / self.acceleration
+        if cells >= ramp:
+            self.peak = max_speed
+            self.cruise_time = (cells - ramp) / max_speed
+        else:
+            self.peak = (self.acceleration * cells) ** 0.5
+            self.cruise_time = 0
+        self.ramp_time = self.peak / self.acceleration
+        # Seconds, the same as costs.straight(cells)
+        self.duration = 2 * self.ramp_time + self.cruise_time
+
+    def speed(self, t):
+        """Speed in cells/s t seconds into the move"""
+        if t < self.ramp_time:
+            return self.acceleration * t
+        t -= self.ramp_time + self.cruise_time
+        if t < 0:
+            return self.peak
+        return max(0.0, self.peak - self.acceleration * t)
+
+
+def pwm_for(speed, table=CALIBRATION):
+    """Motor PWM (0-255) for a wheel speed, interpolating the table"""
+    if speed <= 0:
+        return 0
+    for i in range(1, len(table)):
+        pwm, table_speed = table[i]
+        if speed <= table_speed:
+            low_pwm, low_speed = table[i - 1]
+            return low_pwm + (pwm - low_pwm) * (speed - low_speed) / (table_speed - low_speed)
+    return table[-1][0]
@@ -0,0 +1,192 @@
+"""Replay and compare binary run traces written by runtrace.TraceWriter.
+
+The maze state at any step is rebuilt from the recorded scans and moves
+alone, the exploration policy is never run again, so a trace from the
+robot or from a simulator batch can be scrubbed through at any speed.
+
+    python replay.py run.trace --step 40
+    python replay.py run.trace --play --fps 0
+    python replay.py run.trace --compare other.trace
+"""
+import argparse
+import importlib.util
+import os
+import struct
+import sys
+
+import numpy as np
+
+from runtrace import HAS_MAZE, HEADER, MAGIC, RECORD, VERSION, unpack_walls
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_simulator():
+    """The simulator module, its file name isn't importable as is"""
+    if "mazesim" not in sys.modules:
+        path = os.path.join(_HERE, "mazesolver-skeleton2-sim2.py")
+        spec = importlib.util.spec_from_file_location("mazesim", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["mazesim"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["mazesim"]
+
+
+class Trace:
+    """A trace file read into memory.
+
+    records holds one (x, y, wall_bits, move_x, move_y, planning_us) tuple
+    per step, maze_walls the true (size, size, 4) walls or None for runs
+    recorded on the robot.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, self.size, flags, goal_count = struct.unpack_from(HEADER, data)
+        if magic != MAGIC:
+            raise ValueError("%s is not a run trace" % path)
+        if version != VERSION:
+            raise ValueError("%s has trace version %d, expected %d" % (path, version, VERSION))
+        offset = struct.calcsize(HEADER)
+        goals = data[offset:offset + 2 * goal_count]
+        self.goal_cells = [(goals[i], goals[i + 1]) for i in range(0, len(goals), 2)]
+        offset += 2 * goal_count
+
+        self.maze_walls = None
+        if flags & HAS_MAZE:
+            cells = self.size * self.size
+            bits = np.frombuffer(data, np.uint8, cells, offset).reshape(self.size, self.size)
+            self.maze_walls = (bits[..., None] >> np.arange(4) & 1).astype(bool)
+            offset += cells
+
+        body = data[offset:]
+        body = body[:len(body) - len(body) % struct.calcsize(RECORD)]
+        self.records = list(struct.iter_unpack(RECORD, body))
+        self.path = path
+
+    def __len__(self):
+        return len(self.records)
+
+    def summary(self):
+        planning_us = sum(record[5] for record in self.records)
+        # Cells moved into, as counted by explore()
+        cells = set((record[3], record[4]) for record in self.records)
+        return {
+            "steps": len(self.records),
+            "planning_ms": planning_us / 1000,
+            "mean_step_us": planning_us / len(self.records) if self.records else 0,
+            "cells_explored": len(cells),
+            "reached_goal": any(cell in cells for cell in self.goal_cells),
+        }
+
+
+class Replayer:
+    """Rebuilds the robot's map from a trace one step at a time"""
+    def __init__(self, trace):
+        self.trace = trace
+        self.reset()
+
+    def reset(self):
+        """Back to a blank map before the first step. The grid and robot
+        are new objects, so simulators made before this don't follow them"""
+        sim = load_simulator()
+        self.maze_grid = sim.MazeGrid(self.trace.size, self.trace.goal_cells)
+        self.robot = sim.DraftRobot(self.maze_grid, verbose=False)
+        self.step = 0
+
+    def seek(self, step):
+        """Show the map as it was after step steps. Going back replays the
+        trace from the start. Costs are left for the caller to refresh, the
+        flood fill repairs all changes at once."""
+        step = max(0, min(step, len(self.trace)))
+        if step < self.step:
+            self.reset()
+        grid = self.maze_grid
+        for x, y, bits, move_x, move_y, _ in self.trace.records[self.step:step]:
+            walls = unpack_walls(bits)
+            for direction in range(4):
+                grid.set_wall(x, y, direction, walls[direction])
+            self.robot.position = [move_x, move_y]
+            grid.mark_cell_explored(move_x, move_y)
+        self.step = step
+
+    def simulator(self, fps=0, frame_skip=1):
+        sim = load_simulator()
+        simulator = sim.Simulator(self.robot, self.maze_grid, fps=fps, frame_skip=frame_skip)
+        if self.trace.maze_walls is not None:
+            self.maze_grid.walls = self.trace.maze_walls.copy()
+        else:
+            # Robot traces don't know the real maze, show what was scanned
+            self.maze_grid.walls = self.maze_grid.known_walls
+        return simulator
+
+    def show(self, step, fps=0):
+        self.seek(step)
+        self.maze_grid.update_costs_flood_fill()
+        simulator = self.simulator(fps)
+        simulator.draw(force=True)
+        simulator.ax.set_title("%s, step %d of %d" % (os.path.basename(self.trace.path),
+                                                     self.step, len(self.trace)))
+        return simulator
+
+    def play(self, fps=0, frame_skip=1):
+        """Fast-forward through the whole trace, drawing every frame_skip steps"""
+        simulator = self.simulator(fps, frame_skip)
+        for step in range(len(self.trace) + 1):
+            if step % frame_skip == 0 or step == len(self.trace):
+                self.seek(step)
+                self.maze_grid.update_costs_flood_fill()
+                simulator.draw(force=True)
+        return simulator
+
+
+def first_divergence(a, b):
+    """First step where two traces stand in, or move to, different cells,
+    or None if one is a prefix of the other"""
+    for step, (ra, rb) in enumerate(zip(a.records, b.records)):
+        if (ra[0], ra[1], ra[3], ra[4]) != (rb[0], rb[1], rb[3], rb[4]):
+            return step
+    return None
+
+
+def compare(a, b):
+    rows = [("trace", os.path.basename(a.path), os.path.basename(b.path))]
+    sa, sb = a.summary(), b.summary()
+    for key in sa:
+        fmt = "%.1f" if isinstance(sa[key], float) else "%s"
+        rows.append((key, fmt % sa[key], fmt % sb[key]))
+    step = first_divergence(a, b)
+    rows.append(("first divergence", "-" if step is None else str(step), ""))
+    width = [max(len(row[i]) for row in rows) for i in range(3)]
+    for row in rows:
+        print("  ".join(cell.ljust(width[i]) for i, cell in enumerate(row)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay micromouse run traces")
+    parser.add_argument("trace")
+    parser.add_argument("--step", type=int, default=None,
+                        help="show the map after this many steps, default the end")
+    parser.add_argument("--play", action="store_true",
+                        help="fast-forward through the run")
+    parser.add_argument("--fps", type=float, default=0,
+                        help="frame rate cap while playing, 0 for no cap")
+    parser.add_argument("--frame-skip", type=int, default=1,
+                        help="draw every n-th step while playing")
+    parser.add_argument("--compare", default=None, metavar="FILE",
+                        help="print a side by side summary against another trace")
+    args = parser.parse_args()
+    if args.frame_skip < 1:
+        parser.error("--frame-skip must be at least 1")
+
+    trace = Trace(args.trace)
+    if args.compare:
+        compare(trace, Trace(args.compare))
+    else:
+        import matplotlib.pyplot as plt
+        replayer = Replayer(trace)
+        if args.play:
+            replayer.play(args.fps, args.frame_skip)
+        else:
+            replayer.show(len(trace) if args.step is None else args.step)
+        plt.show()
@@ -0,0 +1,71 @@
+"""Compact binary traces of exploration runs.
+
+A trace is a header followed by one fixed-size record per step:
+
+    header  '<4sBBBB'  magic, version, maze size, flags, goal cell count
+            goal cells as (x, y) byte pairs
+            if HAS_MAZE, size*size bytes of true wall bits (simulator runs)
+    record  '<BBBBBI'  x, y, scanned wall bits, move x, move y,
+                       planning time in microseconds
+
+Wall bits are N=1, E=2, S=4, W=8, the same layout as the cells in
+main3.py. Writing only needs struct and a binary file, so the robot can
+record its own runs; reading is done on the host by replay.py.
+"""
+try:
+    import struct
+except ImportError:
+    import ustruct as struct
+
+MAGIC = b'MMTR'
+VERSION = 1
+HEADER = '<4sBBBB'
+RECORD = '<BBBBBI'
+RECORD_SIZE = struct.calcsize(RECORD)
+# Header flags
+HAS_MAZE = 0x01
+
+
+def pack_walls(walls):
+    """Four N,E,S,W booleans to wall bits"""
+    bits = 0
+    for direction in range(4):
+        if walls[direction]:
+            bits |= 1 << direction
+    return bits
+
+
+def unpack_walls(bits):
+    return [bool(bits & (1 << direction)) for direction in range(4)]
+
+
+class TraceWriter:
+    """Appends step records to a trace file.
+
+    maze_walls is the true (size, size, 4) wall array when it is known, as
+    in the simulator, so replays can draw the real maze as well.
+    """
+    def __init__(self, path, size, goal_cells, maze_walls=None):
+        self.file = open(path, 'wb')
+        flags = HAS_MAZE if maze_walls is not None else 0
+        self.file.write(struct.pack(HEADER, MAGIC, VERSION, size, flags,
+                                    len(goal_cells)))
+        self.file.write(bytes([v for cell in goal_cells for v in cell]))
+        if maze_walls is not None:
+            self.file.write(bytes([pack_walls(maze_walls[y][x])
+                                   for y in range(size) for x in range(size)]))
+        self.steps = 0
+
+    def record(self, x, y, walls, move, planning_us):
+        self.file.write(struct.pack(RECORD, x, y, pack_walls(walls),
+                                    move[0], move[1], min(int(planning_us), 0xFFFFFFFF)))
+        self.steps += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
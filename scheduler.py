@@ -0,0 +1,145 @@
+"""Cooperative scheduler for generator based tasks.
+
+A task is a generator that yields how many milliseconds until it wants to
+run again, 0 to just let the other tasks have a turn:
+
+    def blink():
+        while True:
+            display.set_pixel(0, 0, 9)
+            yield 100
+            display.clear()
+            yield 100
+
+Deadlines are kept in ticks and advanced by the yielded delay, so a task
+that yields its period runs at that rate without drift. A task that
+overruns is rescheduled from now rather than trying to catch up. Each
+task records its loop period, lateness and run time so slow tasks show
+up in report(). Runs under MicroPython and CPython.
+"""
+try:
+    from time import ticks_ms, ticks_us, ticks_add, ticks_diff, sleep_ms
+except ImportError:
+    import time as _time
+
+    def ticks_ms():
+        return _time.perf_counter_ns() // 1000000
+
+    def ticks_us():
+        return _time.perf_counter_ns() // 1000
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(end, start):
+        return end - start
+
+    def sleep_ms(ms):
+        _time.sleep(ms / 1000)
+
+
+class Task:
+    def __init__(self, generator, name, deadline):
+        self.generator = generator
+        self.name = name
+        self.deadline = deadline
+        self.done = False
+        # Value the generator returned, for tasks run to completion
+        self.result = None
+        self.runs = 0
+        self.last_us = None
+        self.period_total_us = 0
+        self.period_max_us = 0
+        self.late_max_ms = 0
+        self.busy_max_us = 0
+
+    def period_us(self):
+        """Mean time between runs"""
+        return self.period_total_us // (self.runs - 1) if self.runs > 1 else 0
+
+
+class Scheduler:
+    def __init__(self):
+        self.tasks = []
+        self.finished = []
+        self.running = False
+
+    def add(self, generator, name=None, delay_ms=0):
+        task = Task(generator, name or 'task%d' % (len(self.tasks) + len(self.finished)),
+                    ticks_add(ticks_ms(), delay_ms))
+        self.tasks.append(task)
+        return task
+
+    def stop(self):
+        """Make run() return after the current task yields"""
+        self.running = False
+
+    def next_task(self):
+        best = self.tasks[0]
+        for task in self.tasks:
+            if ticks_diff(task.deadline, best.deadline) < 0:
+                best = task
+        return best
+
+    def run(self, until=None):
+        """Run tasks until every task has finished, stop() is called, or the
+        task until has finished. Returns until's result if given."""
+        self.running = True
+        while self.running and self.tasks:
+            now = ticks_ms()
+            task = self.next_task()
+            wait = ticks_diff(task.deadline, now)
+            if wait > 0:
+                sleep_ms(wait)
+            elif -wait > task.late_max_ms:
+                task.late_max_ms = -wait
+
+            start = ticks_us()
+            if task.last_us is not None:
+                period = ticks_diff(start, task.last_us)
+                task.period_total_us += period
+                if period > task.period_max_us:
+                    task.period_max_us = period
+            task.last_us = start
+            task.runs += 1
+            try:
+                delay = next(task.generator)
+            except StopIteration as stop:
+                task.done = True
+                task.result = stop.value
+                self.tasks.remove(task)
+                self.finished.append(task)
+                if task is until:
+                    break
+                continue
+            busy = ticks_diff(ticks_us(), start)
+            if busy > task.busy_max_us:
+                task.busy_max_us = busy
+
+            deadline = ticks_add(task.deadline, delay or 0)
+            now = ticks_ms()
+            task.deadline = deadline if ticks_diff(deadline, now) >= 0 else now
+        self.running = False
+        return until.result if until is not None else None
+
+    def report(self):
+        print('task        runs  period_us  max_period_us  max_late_ms  max_busy_us')
+        for task in self.tasks + self.finished:
+            print('%-10s %5d %10d %14d %12d %12d' % (
+                task.name, task.runs, task.period_us(), task.period_max_us,
+                task.late_max_ms, task.busy_max_us))
+
+
+def wait_until(condition, poll_ms=10):
+    """For use with yield from inside a task, polls condition() until true"""
+    while not condition():
+        yield poll_ms
+
+
+def run_task(generator, *others):
+    """Run generator to completion alongside others and return its result,
+    for blocking callers of task code"""
+    scheduler = Scheduler()
+    task = scheduler.add(generator)
+    for other in others:
+        scheduler.add(other)
+    return scheduler.run(until=task)
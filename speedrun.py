@@ -0,0 +1,198 @@
+"""Speed-run planning on an explored maze.
+
+Works with either MazeGrid (main3.py on the robot or the simulator), using
+only grid.size, grid.goal_cells and grid.wall_state(x, y, direction).
+Kept to plain Python so it runs under MicroPython as well.
+
+The search is over (cell, heading) states where the robot is stopped. Each
+move turns in place and then drives a straight segment of one or more
+cells, costed as a trapezoidal velocity profile, so long straights are
+cheaper per cell than short zig-zags.
+"""
+try:
+    from heapq import heappush, heappop
+except ImportError:
+    def heappush(heap, item):
+        heap.append(item)
+        i = len(heap) - 1
+        while i:
+            parent = (i - 1) // 2
+            if heap[parent] <= item:
+                break
+            heap[i] = heap[parent]
+            i = parent
+        heap[i] = item
+
+    def heappop(heap):
+        last = heap.pop()
+        if not heap:
+            return last
+        top = heap[0]
+        i = 0
+        n = len(heap)
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child += 1
+            if last <= heap[child]:
+                break
+            heap[i] = heap[child]
+            i = child
+        heap[i] = last
+        return top
+
+# (dx, dy) for headings N,E,S,W, matching the wall indices
+HEADINGS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+FORWARD = 'F'
+RIGHT = 'R'
+LEFT = 'L'
+AROUND = 'U'
+# Quarter turns clockwise for each turn command
+TURN_QUARTERS = {RIGHT: 1, AROUND: 2, LEFT: 3}
+
+# Cell pitch in metres and the robot's motion limits
+CELL_LENGTH = 0.18
+MAX_SPEED = 0.5
+ACCELERATION = 1.0
+# Seconds for an in-place quarter turn and half turn
+TURN_90 = 0.4
+TURN_180 = 0.7
+
+
+class RunCosts:
+    def __init__(self, cell_length=CELL_LENGTH, max_speed=MAX_SPEED,
+                 acceleration=ACCELERATION, turn_90=TURN_90, turn_180=TURN_180):
+        self.cell_length = cell_length
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.turn_90 = turn_90
+        self.turn_180 = turn_180
+
+    def straight(self, cells):
+        """Seconds to drive cells from stop to stop (trapezoid, or triangle
+        when the segment is too short to reach max_speed)"""
+        distance = cells * self.cell_length
+        ramp = self.max_speed * self.max_speed / self.acceleration
+        if distance >= ramp:
+            return distance / self.max_speed + self.max_speed / self.acceleration
+        return 2 * (distance / self.acceleration) ** 0.5
+
+    def turn(self, quarter_turns):
+        quarter_turns %= 4
+        if quarter_turns == 0:
+            return 0
+        if quarter_turns == 2:
+            return self.turn_180
+        return self.turn_90
+
+
+def plan_speed_run(grid, start=(0, 0), heading=0, costs=None, known_only=True):
+    """Fastest route from start to any goal cell.
+
+    Returns (path, seconds) where path is the list of (x, y) cells from
+    start to goal, or (None, None) if no goal cell can be reached. With
+    known_only, sides that were never scanned are treated as walls so the
+    route only uses passages the robot has actually seen.
+    """
+    if costs is None:
+        costs = RunCosts()
+    size = grid.size
+    goals = set(grid.goal_cells)
+
+    def is_open(x, y, direction):
+        state = grid.wall_state(x, y, direction)
+        if state is None:
+            return not known_only
+        return not state
+
+    best = {(start, heading): 0}
+    previous = {}
+    heap = [(0, start, heading)]
+    while heap:
+        time, cell, facing = heappop(heap)
+        if time > best.get((cell, facing), time):
+            continue
+        if cell in goals:
+            path = [cell]
+            state = (cell, facing)
+            while state in previous:
+                state = previous[state]
+                path.append(state[0])
+            path.reverse()
+            return _expand(path), time
+
+        for direction in range(4):
+            turn_time = costs.turn(direction - facing)
+            dx, dy = HEADINGS[direction]
+            x, y = cell
+            length = 0
+            while (0 <= x + dx < size and 0 <= y + dy < size
+                    and is_open(x, y, direction)):
+                x += dx
+                y += dy
+                length += 1
+                new_time = time + turn_time + costs.straight(length)
+                key = ((x, y), direction)
+                if new_time < best.get(key, new_time + 1):
+                    best[key] = new_time
+                    previous[key] = (cell, facing)
+                    heappush(heap, (new_time, (x, y), direction))
+    return None, None
+
+
+def _expand(corners):
+    # Corner cells to every cell along the way
+    path = [corners[0]]
+    for x, y in corners[1:]:
+        px, py = path[-1]
+        while (px, py) != (x, y):
+            px += (x > px) - (x < px)
+            py += (y > py) - (y < py)
+            path.append((px, py))
+    return path
+
+
+def compile_commands(path, heading=0):
+    """Turn a cell path into motion commands.
+
+    Returns a list of (command, count) pairs, e.g. [('F', 5), ('R', 1),
+    ('F', 2)], where F drives count cells and R/L/U are right, left and
+    about turns.
+    """
+    commands = []
+    for i in range(1, len(path)):
+        dx = path[i][0] - path[i-1][0]
+        dy = path[i][1] - path[i-1][1]
+        direction = HEADINGS.index((dx, dy))
+        turn = (direction - heading) % 4
+        if turn:
+            commands.append(((None, RIGHT, AROUND, LEFT)[turn], 1))
+            heading = direction
+        if commands and commands[-1][0] == FORWARD:
+            commands[-1] = (FORWARD, commands[-1][1] + 1)
+        else:
+            commands.append((FORWARD, 1))
+    return commands
+
+
+def command_time(commands, costs=None):
+    """Predicted seconds to run a command list"""
+    if costs is None:
+        costs = RunCosts()
+    total = 0
+    for command, count in commands:
+        if command == FORWARD:
+            total += costs.straight(count)
+        else:
+            total += costs.turn(TURN_QUARTERS[command])
+    return total
+
+
+def format_commands(commands):
+    names = {FORWARD: 'forward', RIGHT: 'turn right', LEFT: 'turn left',
+             AROUND: 'turn around'}
+    return ', '.join(names[command] + (' %d' % count if command == FORWARD else '')
+                     for command, count in commands)
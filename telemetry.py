@@ -0,0 +1,159 @@
+"""Live binary telemetry from the robot to a host over serial.
+
+Every frame is FRAME_SIZE bytes: a SYNC byte, a kind byte, an 8 byte
+payload and a checksum (sum of kind and payload, low byte), so a receiver
+can pick frames out of a stream that also carries print() text. Payloads
+shorter than 8 bytes are zero padded:
+
+    HELLO  '<BB'      maze size, goal cell count
+    GOAL   '<BB'      one goal cell x, y
+    STEP   '<BBBBI'   x, y, cell byte (wall and seen bits as in main3.py),
+                      direction moved (N,E,S,W = 0-3), planning time in
+                      microseconds
+    COST   '<BBHBBH'  two (x, y, cost) cells, x NO_CELL when unused
+    END    '<BHH'     goal reached, steps, frames dropped
+
+The planner only queues a STEP frame per step. The sender task diffs the
+costs against what the host was last sent, queues COST frames for the
+changes after each step, and writes a few frames per period, so serial
+time is spread out and never lands on the planner. Cost frames only fill
+half the queue, leaving room for steps; anything that doesn't fit is left
+for the next period. STEP frames that don't fit are dropped and counted.
+watch.py is the host side.
+"""
+try:
+    import struct
+except ImportError:
+    import ustruct as struct
+import array
+
+SYNC = 0xA5
+FRAME_SIZE = 11
+HELLO = ord('H')
+GOAL = ord('G')
+STEP = ord('S')
+COST = ord('C')
+END = ord('E')
+PAYLOADS = {
+    HELLO: '<BB',
+    GOAL: '<BB',
+    STEP: '<BBBBI',
+    COST: '<BBHBBH',
+    END: '<BHH',
+}
+PAYLOAD_SIZE = 8
+NO_CELL = 0xFF
+# Frames held for sending, and how many go out each SEND_MS. At 115200
+# baud 4 frames take about 4 ms of a 20 ms period
+QUEUE_FRAMES = 64
+SEND_FRAMES = 4
+SEND_MS = 20
+
+
+def checksum(data, offset=0):
+    """Checksum of the kind and payload of the frame at offset"""
+    total = 0
+    for i in range(offset + 1, offset + FRAME_SIZE - 1):
+        total += data[i]
+    return total & 0xFF
+
+
+class TelemetryWriter:
+    """Queues frames in a preallocated ring and sends them from a task"""
+    def __init__(self, size, goal_cells, frames=QUEUE_FRAMES):
+        self.buffer = bytearray(FRAME_SIZE * frames)
+        self.view = memoryview(self.buffer)
+        self.frames = frames
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+        self.steps = 0
+        # Costs as last queued for the host, none yet so all are sent
+        self.sent_costs = array.array('H', b'\xff\xff' * (size * size))
+        # Set when costs may have changed since they were last diffed
+        self.costs_stale = True
+        self.size = size
+        self.queue(HELLO, size, len(goal_cells))
+        for x, y in goal_cells:
+            self.queue(GOAL, x, y)
+
+    def queue(self, kind, *values):
+        if self.count == self.frames:
+            self.dropped += 1
+            return False
+        offset = (self.head + self.count) % self.frames * FRAME_SIZE
+        buffer = self.buffer
+        buffer[offset] = SYNC
+        buffer[offset + 1] = kind
+        for i in range(offset + 2, offset + 2 + PAYLOAD_SIZE):
+            buffer[i] = 0
+        struct.pack_into(PAYLOADS[kind], buffer, offset + 2, *values)
+        buffer[offset + FRAME_SIZE - 1] = checksum(buffer, offset)
+        self.count += 1
+        return True
+
+    def step(self, x, y, cell, direction, planning_us):
+        self.queue(STEP, x, y, cell, direction, min(int(planning_us), 0xFFFFFFFF))
+        self.steps += 1
+        self.costs_stale = True
+
+    def end(self, reached):
+        self.queue(END, int(bool(reached)), min(self.steps, 0xFFFF), min(self.dropped, 0xFFFF))
+
+    def queue_costs(self, costs):
+        """COST frames for cells that changed since they were last queued,
+        as many as there is room for"""
+        if not self.costs_stale:
+            return
+        self.costs_stale = False
+        sent = self.sent_costs
+        size = self.size
+        room = self.frames // 2
+        pending = -1
+        for i in range(len(costs)):
+            if costs[i] == sent[i]:
+                continue
+            if pending < 0:
+                pending = i
+                continue
+            if self.count >= room:
+                self.costs_stale = True
+                return
+            self.queue(COST, pending % size, pending // size, costs[pending],
+                       i % size, i // size, costs[i])
+            sent[pending] = costs[pending]
+            sent[i] = costs[i]
+            pending = -1
+        if pending >= 0:
+            if self.count >= room:
+                self.costs_stale = True
+                return
+            self.queue(COST, pending % size, pending // size, costs[pending],
+                       NO_CELL, 0, 0)
+            sent[pending] = costs[pending]
+
+    def send(self, write, frames=SEND_FRAMES):
+        """Write up to frames queued frames, returns how many were written"""
+        count = min(self.count, frames, self.frames - self.head)
+        if count:
+            start = self.head * FRAME_SIZE
+            write(self.view[start:start + count * FRAME_SIZE])
+            self.head = (self.head + count) % self.frames
+            self.count -= count
+        return count
+
+    def sender(self, write, costs=None):
+        """Task: send the queue, and cost changes from the costs array"""
+        while True:
+            if costs is not None:
+                self.queue_costs(costs)
+            self.send(write)
+            yield SEND_MS
+
+    def flush(self, write, costs=None):
+        """Send everything left, blocking"""
+        while True:
+            if costs is not None:
+                self.queue_costs(costs)
+            if not self.send(write):
+                return
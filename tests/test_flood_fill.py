@@ -0,0 +1,60 @@
+"""Incremental cost repair against a full recompute, on both MazeGrids"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fakemicrobit
+from replay import load_simulator
+
+sim = load_simulator()
+# main3.py needs the micro:bit modules, the fake car isn't driven here
+if "main3" not in sys.modules:
+    fakemicrobit.install(np.ones((2, 2, 4), dtype=bool))
+import main3
+
+
+def random_changes(rng, size, count):
+    """set_wall arguments setting and clearing random walls"""
+    return [(int(rng.randint(size)), int(rng.randint(size)), int(rng.randint(4)),
+             bool(rng.rand() < 0.7)) for _ in range(count)]
+
+
+def check_repair(grid_class, costs_of):
+    rng = np.random.RandomState(0)
+    for size in (5, 8, 9, 16):
+        for _ in range(10):
+            grid = grid_class(size)
+            changes = []
+            for _ in range(12):
+                batch = random_changes(rng, size, int(rng.randint(1, 8)))
+                changes += batch
+                for call in batch:
+                    grid.set_wall(*call)
+                grid.update_costs_flood_fill()
+                assert grid.verify_costs()
+
+                full = grid_class(size)
+                for call in changes:
+                    full.set_wall(*call)
+                full.update_costs_flood_fill(full=True)
+                assert costs_of(grid) == costs_of(full)
+
+
+def test_main3_repair_matches_full_recompute():
+    check_repair(main3.MazeGrid, lambda grid: list(grid.costs))
+
+
+def test_simulator_repair_matches_full_recompute():
+    check_repair(sim.MazeGrid, lambda grid: grid.costs.tolist())
+
+
+def test_verify_costs_leaves_the_grid_alone():
+    grid = main3.MazeGrid(9)
+    grid.set_wall(3, 3, 0, True)
+    grid.update_costs_flood_fill()
+    grid.distances[5] += 3
+    distances = list(grid.distances)
+    assert not grid.verify_costs()
+    assert list(grid.distances) == distances
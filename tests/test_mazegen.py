@@ -0,0 +1,101 @@
+"""Seeded maze generation and the maze file formats"""
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mazegen import (format_maze, generate_maze, generate_mazes, load_maze, parse_maz,
+                     parse_num_maze, parse_text_maze)
+from replay import load_simulator
+
+# generate_maze(5, 1), drawn by format_maze
+SEED_1_DRAWING = """\
+o---o---o---o---o---o
+|                   |
+o   o---o   o---o   o
+|   |           |   |
+o   o   o---o---o   o
+|   |   |           |
+o   o   o   o---o   o
+|       |   |   |   |
+o---o---o   o   o   o
+|           |       |
+o---o---o---o---o---o
+"""
+# sha256 of np.packbits(generate_maze(16, seed))
+SEED_HASHES = {
+    0: "7bae2699bf14280b169b321878d7deedb1c0e81bd617b395184ee5d9401d3ea1",
+    7: "c12336d494c9b79ba088893c53507cc54a4d08d54480253d047cc6f7611746bd",
+}
+
+
+def encode_num(walls):
+    size = walls.shape[0]
+    return "".join("%d %d %d %d %d %d\n" % ((x, y) + tuple(int(w) for w in walls[y, x]))
+                   for x in range(size) for y in range(size))
+
+
+def encode_maz(walls):
+    # Column by column from the south-west corner, bits N=1, E=2, S=4, W=8
+    bits = (walls.astype(np.uint8) << np.arange(4, dtype=np.uint8)).sum(axis=2)
+    return bits.T.astype(np.uint8).tobytes()
+
+
+def test_seeded_mazes_never_change():
+    assert format_maze(generate_maze(5, 1)) == SEED_1_DRAWING
+    for seed, digest in SEED_HASHES.items():
+        walls = generate_maze(16, seed)
+        assert hashlib.sha256(np.packbits(walls).tobytes()).hexdigest() == digest
+
+
+def test_same_seed_same_maze():
+    mazes = generate_mazes(9, [3, 4, 3])
+    assert np.array_equal(mazes[0], mazes[2])
+    assert not np.array_equal(mazes[0], mazes[1])
+    sim = load_simulator()
+    grid = sim.MazeGrid(9)
+    simulator = sim.Simulator(sim.DraftRobot(grid, verbose=False), grid, headless=True)
+    simulator.generate_random_maze(3)
+    assert np.array_equal(grid.walls, mazes[0])
+
+
+def test_file_formats_round_trip():
+    for size in (2, 5, 16):
+        for seed in range(3):
+            walls = generate_maze(size, seed)
+            drawing = format_maze(walls)
+            assert np.array_equal(parse_text_maze(drawing), walls)
+            assert np.array_equal(parse_text_maze(drawing.replace("o", "+")), walls)
+            assert np.array_equal(parse_num_maze(encode_num(walls)), walls)
+            assert np.array_equal(parse_maz(encode_maz(walls)), walls)
+
+
+def test_load_maze_by_extension(tmp_path):
+    walls = generate_maze(8, 2)
+    (tmp_path / "maze.txt").write_text(format_maze(walls))
+    (tmp_path / "maze.num").write_text(encode_num(walls))
+    (tmp_path / "maze.maz").write_bytes(encode_maz(walls))
+    for name in ("maze.txt", "maze.num", "maze.maz"):
+        assert np.array_equal(load_maze(str(tmp_path / name)), walls)
+
+
+def test_one_sided_walls_are_closed():
+    # A wall only on one side of a passage, and missing outer walls
+    walls = np.zeros((3, 3, 4), dtype=bool)
+    walls[1, 1, 1] = True
+    loaded = parse_maz(encode_maz(walls))
+    assert loaded[1, 1, 1] and loaded[1, 2, 3]
+    assert loaded[2, :, 0].all() and loaded[0, :, 2].all()
+    assert loaded[:, 2, 1].all() and loaded[:, 0, 3].all()
+
+
+def test_bad_files_are_rejected():
+    with pytest.raises(ValueError):
+        parse_text_maze("o---o\n")
+    with pytest.raises(ValueError):
+        parse_num_maze("0 0 1 1 1 1\n1 1 1 1 1 1\n")
+    with pytest.raises(ValueError):
+        parse_maz(b"\x0f" * 5)
@@ -0,0 +1,101 @@
+"""PathTable lookups against a plain BFS over the known walls"""
+import os
+import sys
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from replay import load_simulator
+
+sim = load_simulator()
+
+
+def bfs(grid, start):
+    """Distances from start over known_walls, as {(x, y): cells}"""
+    distance = {start: 0}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        for direction, (dy, dx) in enumerate(sim.DIRECTIONS):
+            cell = (x + dx, y + dy)
+            if not grid.has_wall(x, y, direction) and cell not in distance:
+                distance[cell] = distance[(x, y)] + 1
+                queue.append(cell)
+    return distance
+
+
+def check_route(grid, route, start, target):
+    """route is a shortest route from start to target through open sides"""
+    assert route[0] == start and route[-1] == target
+    assert len(route) - 1 == bfs(grid, start)[target]
+    for (x, y), (nx, ny) in zip(route, route[1:]):
+        direction = sim.DIRECTIONS.index((ny - y, nx - x))
+        assert not grid.has_wall(x, y, direction)
+
+
+def random_walls(grid, rng, changes):
+    """Set and clear random walls, looking routes up in between so rows
+    are fresh when later walls invalidate them"""
+    size = grid.size
+    for step in range(changes):
+        grid.set_wall(rng.randint(size), rng.randint(size), rng.randint(4), rng.rand() < 0.6)
+        if step % 5 == 0:
+            grid.paths.refresh(rng.randint(size * size, size=3))
+
+
+def test_distances_match_bfs_after_wall_changes():
+    rng = np.random.RandomState(0)
+    for size in (4, 7, 10):
+        grid = sim.MazeGrid(size)
+        grid.paths.refresh()
+        random_walls(grid, rng, 200)
+        for x in range(size):
+            for y in range(size):
+                expected = np.full((size, size), sim.UNREACHABLE)
+                for (cx, cy), cells in bfs(grid, (x, y)).items():
+                    expected[cy, cx] = cells
+                assert np.array_equal(grid.paths.distances_from(x, y), expected)
+
+
+def test_route_helpers_match_bfs():
+    rng = np.random.RandomState(1)
+    size = 8
+    grid = sim.MazeGrid(size)
+    for _ in range(20):
+        random_walls(grid, rng, 15)
+        grid.explored[rng.randint(size), rng.randint(size)] = True
+        position = (rng.randint(size), rng.randint(size))
+        reachable = bfs(grid, position)
+
+        goals = [cell for cell in grid.goal_cells if cell in reachable]
+        route = grid.paths.route_to_goal(position)
+        if goals:
+            check_route(grid, route, position, route[-1])
+            assert len(route) - 1 == min(reachable[cell] for cell in goals)
+        else:
+            assert route is None
+
+        route = grid.paths.route_to_start(position)
+        if (0, 0) in reachable:
+            check_route(grid, route, position, (0, 0))
+        else:
+            assert route is None
+
+        unexplored = [cell for cell in reachable if not grid.explored[cell[1], cell[0]]]
+        route = grid.paths.route_to_unexplored(position)
+        if unexplored:
+            check_route(grid, route, position, route[-1])
+            assert not grid.explored[route[-1][1], route[-1][0]]
+            assert len(route) - 1 == min(reachable[cell] for cell in unexplored)
+        else:
+            assert route is None
+
+
+def test_walled_off_goal_has_no_route():
+    grid = sim.MazeGrid(6)
+    for x, y in grid.goal_cells:
+        for direction in range(4):
+            grid.set_wall(x, y, direction, True)
+    assert grid.paths.route_to_goal((0, 0)) is None
+    assert grid.paths.route_to_start((5, 5)) is not None
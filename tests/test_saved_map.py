@@ -0,0 +1,69 @@
+"""main3.py's bit-packed map image, saved to flash between runs"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fakemicrobit
+# main3.py needs the micro:bit modules, the fake car isn't driven here
+if "main3" not in sys.modules:
+    fakemicrobit.install(np.ones((2, 2, 4), dtype=bool))
+import main3
+
+
+def random_map(size, seed):
+    """A grid with random walls, some of them removed again, and random
+    explored cells"""
+    rng = np.random.RandomState(seed)
+    grid = main3.MazeGrid(size)
+    for _ in range(3 * size * size):
+        grid.set_wall(int(rng.randint(size)), int(rng.randint(size)), int(rng.randint(4)),
+                      bool(rng.rand() < 0.6))
+    for i in range(size * size):
+        grid.explored[i] = rng.rand() < 0.4
+    grid.update_costs_flood_fill(full=True)
+    return grid
+
+
+def test_pack_and_load_round_trip():
+    for size in (2, 5, 9, 16):
+        for seed in range(5):
+            grid = random_map(size, seed)
+            loaded = main3.MazeGrid(size)
+            assert loaded.load_map(grid.pack_map())
+            assert loaded.cells == grid.cells
+            assert loaded.explored == grid.explored
+            assert list(loaded.costs) == list(grid.costs)
+
+
+def test_packed_size():
+    assert len(main3.MazeGrid(9).pack_map()) == 51
+
+
+def test_save_and_load_file(tmp_path):
+    grid = random_map(9, 1)
+    path = str(tmp_path / main3.MAP_FILE)
+    assert main3.save_map(grid, path)
+    loaded = main3.load_map(9, None, path)
+    assert loaded.cells == grid.cells
+    assert loaded.explored == grid.explored
+    # No file is a blank map
+    assert main3.load_map(9, None, str(tmp_path / "none.bin")).cells == main3.MazeGrid(9).cells
+
+
+def test_rejects_images_that_dont_fit():
+    data = random_map(9, 2).pack_map()
+    blank = main3.MazeGrid(9).cells
+    bad_magic = bytearray(data)
+    bad_magic[0] ^= 0xFF
+    bad_version = bytearray(data)
+    bad_version[2] += 1
+    bad_size = bytearray(data)
+    bad_size[3] = 8
+    for image in (bad_magic, bad_version, bad_size, data[:-1], data + b"\0"):
+        grid = main3.MazeGrid(9)
+        assert not grid.load_map(image)
+        assert grid.cells == blank
+    # A map saved for another maze size
+    assert not main3.MazeGrid(8).load_map(data)
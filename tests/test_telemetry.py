@@ -0,0 +1,109 @@
+"""Telemetry frames from TelemetryWriter read back by watch.FrameReader"""
+import array
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from telemetry import (COST, END, FRAME_SIZE, GOAL, HELLO, NO_CELL, STEP, SYNC,
+                       TelemetryWriter)
+from watch import FrameReader
+
+
+class Port:
+    """Collects what the writer sends"""
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += bytes(data)
+
+
+def apply_costs(frames, costs, size):
+    for kind, values in frames:
+        if kind == COST:
+            x, y, cost, x2, y2, cost2 = values
+            costs[y * size + x] = cost
+            if x2 != NO_CELL:
+                costs[y2 * size + x2] = cost2
+
+
+def test_frames_survive_the_ring_wrapping():
+    port = Port()
+    writer = TelemetryWriter(4, [(1, 1), (2, 2)], frames=8)
+    expected = [(HELLO, (4, 2)), (GOAL, (1, 1)), (GOAL, (2, 2))]
+    for i in range(50):
+        step = (i % 4, i // 4 % 4, i & 0xFF, i % 4, 1000 * i)
+        writer.step(*step)
+        expected.append((STEP, step))
+        # Uneven sends so the head lands all over the ring
+        writer.send(port.write, frames=1 + i % 3)
+    writer.end(True)
+    expected.append((END, (1, 50, 0)))
+    writer.flush(port.write)
+    assert writer.dropped == 0
+    assert FrameReader().feed(port.data) == expected
+
+
+def test_full_queue_drops_steps_and_counts_them():
+    port = Port()
+    writer = TelemetryWriter(4, [], frames=4)
+    for i in range(6):
+        writer.step(0, 0, 0, 0, i)
+    writer.flush(port.write)
+    writer.end(False)
+    writer.flush(port.write)
+    frames = FrameReader().feed(port.data)
+    assert [kind for kind, _ in frames] == [HELLO, STEP, STEP, STEP, END]
+    assert frames[-1][1] == (0, 6, 3)
+
+
+def test_reader_skips_print_text_and_damaged_frames():
+    port = Port()
+    writer = TelemetryWriter(9, [(4, 4)])
+    for i in range(5):
+        writer.step(i, 0, 0x11, 1, 10 * i)
+    writer.flush(port.write)
+    frames = [bytes(port.data[i:i + FRAME_SIZE]) for i in range(0, len(port.data), FRAME_SIZE)]
+    damaged = bytearray(frames[3])
+    damaged[4] ^= 0x40
+    # Text with a stray SYNC byte, and a damaged STEP frame
+    stream = (frames[0] + b"Scanning \xa5 cell\n" + frames[1] + frames[2] + bytes(damaged) +
+              bytes([SYNC, STEP]) + b" text" + b"".join(frames[4:]))
+    reader = FrameReader()
+    decoded = []
+    # Fed in awkward chunks, so frames arrive split
+    for start in range(0, len(stream), 7):
+        decoded += reader.feed(stream[start:start + 7])
+    assert decoded == FrameReader().feed(b"".join(frames[:3] + frames[4:]))
+    assert [values[0] for kind, values in decoded if kind == STEP] == [0, 2, 3, 4]
+    assert reader.bad_frames == 2
+
+
+def test_cost_frames_carry_only_changes():
+    size = 5
+    costs = array.array('H', range(size * size))
+    port = Port()
+    writer = TelemetryWriter(size, [(2, 2)], frames=8)
+    host = [0xFFFF] * (size * size)
+    reader = FrameReader()
+    # More changes than half the queue holds, so they go out over a few periods
+    sends = 0
+    while writer.costs_stale or writer.count:
+        writer.queue_costs(costs)
+        writer.send(port.write)
+        sends += 1
+    assert sends > 1
+    apply_costs(reader.feed(port.data), host, size)
+    assert host == list(costs)
+
+    port.data = bytearray()
+    costs[3] = 40
+    costs[17] = 41
+    costs[24] = 42
+    writer.step(0, 0, 0, 0, 0)
+    writer.flush(port.write, costs)
+    frames = reader.feed(port.data)
+    changed = [values for kind, values in frames if kind == COST]
+    assert changed == [(3, 0, 40, 2, 3, 41), (4, 4, 42, NO_CELL, 0, 0)]
+    apply_costs(frames, host, size)
+    assert host == list(costs)
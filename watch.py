@@ -0,0 +1,187 @@
+"""Watch the robot's map build live from its telemetry frames.
+
+Reads the binary frames of telemetry.py from the robot's USB serial port
+(needs pyserial) or from a capture file, and draws the scanned walls,
+costs and position in the simulator's view as they arrive. Text printed
+on the same port is skipped.
+
+    python watch.py /dev/ttyACM0
+    python watch.py capture.bin --follow
+"""
+import argparse
+import os
+import struct
+import time
+
+from replay import load_simulator
+from speedrun import HEADINGS
+from telemetry import (COST, END, FRAME_SIZE, GOAL, HELLO, NO_CELL, PAYLOADS, STEP, SYNC,
+                       checksum)
+
+# How long to wait for more data between reads, in seconds
+IDLE_WAIT = 0.05
+
+
+class FrameReader:
+    """Picks telemetry frames out of a byte stream fed in any chunks"""
+    def __init__(self):
+        self.data = bytearray()
+        self.bad_frames = 0
+
+    def feed(self, data):
+        """Frames completed by data, as (kind, values) pairs"""
+        self.data += data
+        frames = []
+        start = 0
+        while True:
+            start = self.data.find(SYNC, start)
+            if start < 0 or len(self.data) - start < FRAME_SIZE:
+                break
+            kind = self.data[start + 1]
+            if kind in PAYLOADS and checksum(self.data, start) == self.data[start + FRAME_SIZE - 1]:
+                frames.append((kind, struct.unpack_from(PAYLOADS[kind], self.data, start + 2)))
+                start += FRAME_SIZE
+            else:
+                # A SYNC byte in print() text or a damaged frame
+                self.bad_frames += kind in PAYLOADS
+                start += 1
+        if start < 0:
+            self.data = bytearray()
+        else:
+            del self.data[:start]
+        return frames
+
+
+class LiveMap:
+    """The robot's map rebuilt from frames, drawn with the simulator"""
+    def __init__(self, fps=10):
+        self.fps = fps
+        self.size = None
+        self.goal_cells = []
+        self.goal_count = 0
+        self.maze_grid = None
+        self.robot = None
+        self.simulator = None
+        self.steps = 0
+        self.planning_us = 0
+        self.result = None
+
+    def apply(self, kind, values):
+        """Update the map from one frame, returns True if it changed"""
+        if kind == HELLO:
+            self.size, goal_count = values
+            self.goal_cells = []
+            self.goal_count = goal_count
+            self.maze_grid = None
+            return False
+        if kind == GOAL:
+            if self.size is not None and len(self.goal_cells) < self.goal_count:
+                self.goal_cells.append(values)
+                if len(self.goal_cells) == self.goal_count:
+                    self.start()
+            return False
+        if self.maze_grid is None:
+            # Joined part way through a run, wait for the next HELLO
+            return False
+        grid = self.maze_grid
+        if kind == STEP:
+            x, y, cell, direction, planning_us = values
+            for side in range(4):
+                if cell & (0x10 << side):
+                    grid.set_wall(x, y, side, bool(cell & (1 << side)))
+            grid.mark_cell_explored(x, y)
+            dx, dy = HEADINGS[direction]
+            self.robot.position = [x + dx, y + dy]
+            grid.mark_cell_explored(x + dx, y + dy)
+            self.steps += 1
+            self.planning_us += planning_us
+        elif kind == COST:
+            x, y, cost, x2, y2, cost2 = values
+            grid.costs[y, x] = cost
+            if x2 != NO_CELL:
+                grid.costs[y2, x2] = cost2
+        elif kind == END:
+            self.result = values
+        return True
+
+    def start(self):
+        sim = load_simulator()
+        self.maze_grid = sim.MazeGrid(self.size, self.goal_cells)
+        # Only what the robot has seen is known, so that's the maze drawn
+        self.maze_grid.walls = self.maze_grid.known_walls
+        self.robot = sim.DraftRobot(self.maze_grid, verbose=False)
+        self.simulator = sim.Simulator(self.robot, self.maze_grid, fps=self.fps)
+        self.steps = 0
+        self.planning_us = 0
+        self.result = None
+
+    def draw(self):
+        if self.simulator is not None:
+            if self.simulator.artists is not None:
+                self.simulator.ax.set_title("step %d" % self.steps)
+            self.simulator.draw(force=True)
+
+    def idle(self, seconds):
+        """Keep the window responsive while waiting for data"""
+        if self.simulator is not None and self.simulator.artists is not None:
+            self.simulator.fig.canvas.start_event_loop(seconds)
+        else:
+            time.sleep(seconds)
+
+
+def open_source(source, baud):
+    """A read(n) function for a capture file or a serial port"""
+    if os.path.isfile(source):
+        return open(source, "rb")
+    try:
+        import serial
+    except ImportError:
+        raise SystemExit("reading from a serial port needs pyserial: pip install pyserial")
+    return serial.Serial(source, baud, timeout=IDLE_WAIT)
+
+
+def watch(source, baud=115200, follow=False, fps=10):
+    """Draw frames from source until the robot's END frame, or the end of
+    a capture file unless following it"""
+    stream = open_source(source, baud)
+    reader = FrameReader()
+    live = LiveMap(fps)
+    is_file = os.path.isfile(source)
+    try:
+        while live.result is None:
+            data = stream.read(4096)
+            if not data:
+                if is_file and not follow:
+                    break
+                live.idle(IDLE_WAIT)
+                continue
+            changed = False
+            for kind, values in reader.feed(data):
+                changed |= live.apply(kind, values)
+            if changed:
+                live.draw()
+    finally:
+        stream.close()
+    return live, reader
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch the robot's telemetry live")
+    parser.add_argument("source", help="serial port, or a file of captured frames")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--follow", action="store_true",
+                        help="keep reading a capture file as it grows")
+    parser.add_argument("--fps", type=float, default=10,
+                        help="redraw rate cap, 0 for no cap")
+    args = parser.parse_args()
+
+    import matplotlib.pyplot as plt
+    live, reader = watch(args.source, args.baud, args.follow, args.fps)
+    if live.steps:
+        print("%d steps, mean planning %.0f us" % (live.steps, live.planning_us / live.steps))
+    if live.result is not None:
+        reached, steps, dropped = live.result
+        print("goal %s after %d steps, %d frames dropped on the robot" % (
+            "reached" if reached else "not reached", steps, dropped))
+    print("%d damaged frames" % reader.bad_frames)
+    plt.show()